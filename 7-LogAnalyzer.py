@@ -1,7 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from collections import defaultdict
+from datetime import datetime
 import os
+import re
+import threading
+
+from log_analyzer_core import (
+    DETAIL_PAGE_SIZE,
+    MATCHER_MODES,
+    PARSER_CHOICES,
+    LineIndex,
+    LogFollower,
+    LogStreamAnalyzer,
+    detect_parser,
+    find_rotation_series,
+    is_compressed,
+)
 
 # 尝试导入 tkinterdnd2 以实现拖放功能
 try:
@@ -13,6 +28,138 @@ except ImportError:
     print("警告: tkinterdnd2 未安装，拖放功能不可用")
 
 
+class LogViewer(ttk.Frame):
+    """虚拟化的日志查看器：只渲染窗口中可见的行，可以滚动或跳转到任意一行"""
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.index = None
+        self.first_line = 0
+        self.target_line = None
+        self.index_thread = None
+        self.index_stop = threading.Event()
+
+        # 跳转工具栏
+        toolbar = ttk.Frame(self)
+        toolbar.pack(fill=tk.X)
+        ttk.Label(toolbar, text="跳转到行:").pack(side=tk.LEFT)
+        self.goto_entry = ttk.Entry(toolbar, width=12)
+        self.goto_entry.pack(side=tk.LEFT, padx=5)
+        self.goto_entry.bind("<Return>", lambda e: self.goto_entry_line())
+        ttk.Button(toolbar, text="跳转", command=self.goto_entry_line).pack(side=tk.LEFT)
+        self.info_label = ttk.Label(toolbar, text="", foreground="gray")
+        self.info_label.pack(side=tk.RIGHT)
+
+        # 文本区域只存放可见的行，滚动条按行号换算位置
+        self.scrollbar = ttk.Scrollbar(self, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(self, wrap=tk.NONE, height=10)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.text.tag_configure("target", background="#fff3a0")
+
+        self.text.bind("<Configure>", lambda e: self.render())
+        self.text.bind("<MouseWheel>", lambda e: self.scroll_lines(-3 if e.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda e: self.scroll_lines(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll_lines(3))
+        self.text.bind("<Prior>", lambda e: self.scroll_lines(-self.visible_rows()))
+        self.text.bind("<Next>", lambda e: self.scroll_lines(self.visible_rows()))
+
+    def open(self, path):
+        """打开新文件，立即显示开头部分，行索引稍后在后台建立"""
+        self.close()
+        if is_compressed(path):
+            self.info_label.config(text="压缩文件不支持预览")
+            return
+        self.index = LineIndex(path)
+        self.first_line = 0
+        self.target_line = None
+        self.render()
+
+    def refresh(self):
+        """在后台(增量)建立行索引，完成后刷新显示"""
+        if self.index is None or (self.index_thread is not None and self.index_thread.is_alive()):
+            return
+        index = self.index
+        self.index_stop = threading.Event()
+        self.info_label.config(text="正在建立行索引...")
+
+        def build():
+            index.update(self.index_stop)
+            self.after(0, self.render)
+
+        self.index_thread = threading.Thread(target=build, daemon=True)
+        self.index_thread.start()
+
+    def close(self):
+        self.index_stop.set()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        self.text.delete(1.0, tk.END)
+        self.info_label.config(text="")
+
+    def visible_rows(self):
+        linespace = max(1, self.text.tk.call("font", "metrics", self.text.cget("font"), "-linespace"))
+        return max(1, self.text.winfo_height() // linespace)
+
+    def max_first_line(self):
+        if self.index is None:
+            return 0
+        return max(0, self.index.line_count - self.visible_rows())
+
+    def render(self):
+        """只读取并显示当前可见的几十行"""
+        self.text.delete(1.0, tk.END)
+        if self.index is None:
+            self.scrollbar.set(0, 1)
+            return
+
+        rows = self.visible_rows()
+        for i, line in enumerate(self.index.lines(self.first_line, rows)):
+            line_no = self.first_line + i
+            tags = ("target",) if line_no == self.target_line else ()
+            self.text.insert(tk.END, f"{line_no + 1:>8}  {line}\n", tags)
+
+        total = self.index.line_count
+        if total:
+            self.scrollbar.set(self.first_line / total, min(1.0, (self.first_line + rows) / total))
+        else:
+            self.scrollbar.set(0, 1)
+        if self.index.complete:
+            self.info_label.config(text=f"共 {total} 行")
+
+    def scroll_lines(self, delta):
+        self.goto(self.first_line + delta, highlight=False)
+        return "break"
+
+    def on_scroll(self, *args):
+        if self.index is None:
+            return
+        if args[0] == "moveto":
+            self.goto(int(float(args[1]) * self.index.line_count), highlight=False)
+        elif args[0] == "scroll":
+            step = self.visible_rows() if args[2] == "pages" else 1
+            self.scroll_lines(int(args[1]) * step)
+
+    def goto(self, line_no, highlight=True):
+        """跳转到第 line_no 行(从0开始)，highlight 时把该行显示在顶部并高亮"""
+        if self.index is None:
+            return
+        if highlight:
+            self.target_line = line_no
+        limit = self.max_first_line() if self.index.complete else line_no
+        self.first_line = max(0, min(line_no, limit))
+        self.render()
+
+    def goto_entry_line(self):
+        try:
+            line_no = int(self.goto_entry.get()) - 1
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的行号")
+            return
+        self.goto(line_no)
+
+
 class SimpleLogAnalyzer:
     def __init__(self, root):
         self.root = root
@@ -21,9 +168,14 @@ class SimpleLogAnalyzer:
 
         # 初始化变量
         self.log_file_path = ""
-        self.log_data = []
-        self.error_lines = []
+        self.analyzer = None
         self.error_stats = defaultdict(int)
+        self.stats_items = {}  # 错误类型 -> stats_tree 中的行，用于原地刷新计数
+        self.detail_type = None
+        self.detail_page = 0
+        self.following = False
+        self.stop_event = threading.Event()
+        self.analysis_thread = None
         self.error_keywords = ["error", "exception", "fail", "critical", "warning"]
 
         # 创建UI
@@ -65,17 +217,57 @@ class SimpleLogAnalyzer:
         self.keywords_entry.pack(side=tk.LEFT, padx=5)
         self.keywords_entry.insert(0, ", ".join(self.error_keywords))
 
-        # 分析按钮
-        ttk.Button(top_frame, text="分析日志", command=self.analyze_log).pack(pady=5)
+        # 匹配算法选择
+        ttk.Label(config_frame, text="匹配算法:").pack(side=tk.LEFT, padx=(10, 0))
+        self.matcher_var = tk.StringVar(value=MATCHER_MODES[0])
+        ttk.Combobox(config_frame, textvariable=self.matcher_var, values=MATCHER_MODES,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+
+        # 多进程并行分析
+        self.parallel_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="多进程并行", variable=self.parallel_var).pack(side=tk.LEFT, padx=5)
+
+        # 把同类错误按消息模板聚类
+        self.templates_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="模板聚类", variable=self.templates_var).pack(side=tk.LEFT, padx=5)
+
+        # 跟踪模式：分析完成后继续监视文件新增的内容
+        self.follow_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="跟踪文件", variable=self.follow_var).pack(side=tk.LEFT, padx=5)
+
+        # 把 system.log.0.gz 等轮转文件与当前文件作为一个整体分析
+        self.series_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="包含轮转文件", variable=self.series_var).pack(side=tk.LEFT, padx=5)
+
+        # 分析按钮与进度
+        action_frame = ttk.Frame(top_frame)
+        action_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(action_frame, text="日志格式:").pack(side=tk.LEFT)
+        self.parser_var = tk.StringVar(value=PARSER_CHOICES[0])
+        ttk.Combobox(action_frame, textvariable=self.parser_var, values=PARSER_CHOICES,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        self.analyze_btn = ttk.Button(action_frame, text="分析日志", command=self.analyze_log)
+        self.analyze_btn.pack(side=tk.LEFT)
+        self.cancel_btn = ttk.Button(action_frame, text="取消", command=self.cancel_analysis, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="时间分布", command=self.show_time_histogram).pack(side=tk.LEFT)
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(action_frame, variable=self.progress_var, maximum=100).pack(
+            side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.progress_label = ttk.Label(action_frame, text="就绪", width=24)
+        self.progress_label.pack(side=tk.LEFT)
 
         # 中间框架 - 结果显示
         middle_frame = ttk.LabelFrame(self.root, text="分析结果", padding=10)
         middle_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
         # 错误统计表格
-        self.stats_tree = ttk.Treeview(middle_frame, columns=("type", "count"), show="headings")
-        self.stats_tree.heading("type", text="错误类型")
+        # 启用模板聚类时，每种错误类型下可以展开查看各个消息模板；line/offset 列只用于定位示例行
+        self.stats_tree = ttk.Treeview(middle_frame, columns=("type", "count", "line", "offset"),
+                                       displaycolumns=("type", "count"), show="tree headings")
+        self.stats_tree.heading("type", text="错误类型 / 消息模板")
         self.stats_tree.heading("count", text="数量")
+        self.stats_tree.column("#0", width=24, stretch=False)
         self.stats_tree.column("type", width=300)
         self.stats_tree.column("count", width=100)
         self.stats_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -88,22 +280,27 @@ class SimpleLogAnalyzer:
         self.detail_text = tk.Text(detail_frame, width=50, height=15, wrap=tk.WORD)
         self.detail_text.pack(fill=tk.BOTH, expand=True)
 
+        # 详情分页控制
+        page_frame = ttk.Frame(detail_frame)
+        page_frame.pack(fill=tk.X)
+        self.prev_btn = ttk.Button(page_frame, text="上一页", command=self.prev_detail_page, state=tk.DISABLED)
+        self.prev_btn.pack(side=tk.LEFT)
+        self.page_label = ttk.Label(page_frame, text="")
+        self.page_label.pack(side=tk.LEFT, expand=True)
+        self.next_btn = ttk.Button(page_frame, text="下一页", command=self.next_detail_page, state=tk.DISABLED)
+        self.next_btn.pack(side=tk.RIGHT)
+
         # 底部框架 - 日志预览
         bottom_frame = ttk.LabelFrame(self.root, text="日志预览", padding=10)
         bottom_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
-        # 日志内容显示
-        self.log_text = tk.Text(bottom_frame, wrap=tk.WORD)
-        self.log_text.pack(fill=tk.BOTH, expand=True)
-
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(self.log_text)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.log_text.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.log_text.yview)
+        # 日志内容显示，只渲染可见的行
+        self.log_viewer = LogViewer(bottom_frame)
+        self.log_viewer.pack(fill=tk.BOTH, expand=True)
 
         # 绑定事件
         self.stats_tree.bind("<<TreeviewSelect>>", self.show_error_detail)
+        self.detail_text.bind("<ButtonRelease-1>", self.jump_to_detail_line)
 
     def handle_drop(self, event):
         # 处理拖拽文件
@@ -116,7 +313,8 @@ class SimpleLogAnalyzer:
 
     def browse_file(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("日志文件", "*.log"), ("文本文件", "*.txt"), ("所有文件", "*.*")])
+            filetypes=[("日志文件", "*.log"), ("文本文件", "*.txt"), ("压缩日志", "*.gz *.bz2 *.xz"),
+                       ("所有文件", "*.*")])
         if file_path:
             self.log_file_path = file_path
             self.file_entry.delete(0, tk.END)
@@ -132,63 +330,285 @@ class SimpleLogAnalyzer:
         if keywords:
             self.error_keywords = [kw.strip().lower() for kw in keywords.split(",") if kw.strip()]
 
-        try:
-            # 读取日志文件
-            with open(self.log_file_path, 'r', encoding='utf-8') as f:
-                self.log_data = f.readlines()
-
-            # 清空之前的结果
-            self.error_lines = []
-            self.error_stats = defaultdict(int)
-            for item in self.stats_tree.get_children():
-                self.stats_tree.delete(item)
-            self.log_text.delete(1.0, tk.END)
-            self.detail_text.delete(1.0, tk.END)
-
-            # 分析日志
-            for line in self.log_data:
-                # 检查错误关键词
-                line_lower = line.lower()
-                if any(keyword in line_lower for keyword in self.error_keywords):
-                    self.error_lines.append(line)
-
-                    # 确定错误类型
-                    error_type = "其他错误"
-                    for kw in self.error_keywords:
-                        if kw in line_lower:
-                            error_type = kw.capitalize() + " 错误"
-                            break
-
-                    self.error_stats[error_type] += 1
-
-            # 显示统计结果
-            for error_type, count in sorted(self.error_stats.items(), key=lambda x: x[1], reverse=True):
-                self.stats_tree.insert("", tk.END, values=(error_type, count))
-
-            # 显示日志预览
-            self.log_text.insert(tk.END, "".join(self.log_data[:500]))  # 只显示前500行避免卡顿
-
-            messagebox.showinfo("完成", f"日志分析完成，共找到 {len(self.error_lines)} 条错误信息")
+        if self.analysis_thread is not None and self.analysis_thread.is_alive():
+            messagebox.showwarning("警告", "正在分析中，请稍候或先取消")
+            return
+
+        # 清空之前的结果
+        for item in self.stats_tree.get_children():
+            self.stats_tree.delete(item)
+        self.stats_items = {}
+        self.detail_type = None
+        self.render_detail_page()
 
+        try:
+            paths = find_rotation_series(self.log_file_path) if self.series_var.get() else [self.log_file_path]
+            if self.follow_var.get() and (len(paths) > 1 or is_compressed(self.log_file_path)):
+                messagebox.showwarning("警告", "跟踪模式只支持未压缩的单个日志文件")
+                return
+
+            # 显示日志预览，行索引在分析结束后再建立，避免与分析线程争抢
+            self.log_viewer.open(self.log_file_path)
+            parser = self.parser_var.get()
+            if parser == PARSER_CHOICES[0]:
+                parser = None
+            elif parser == PARSER_CHOICES[1]:
+                parser = detect_parser(self.log_file_path)
+            self.analyzer = LogStreamAnalyzer(self.error_keywords, matcher=self.matcher_var.get(), parser=parser,
+                                              templates=self.templates_var.get())
         except Exception as e:
             messagebox.showerror("错误", f"分析日志时出错: {str(e)}")
+            return
+
+        self.error_stats = self.analyzer.error_stats
+        self.following = self.follow_var.get()
+        self.stop_event = threading.Event()
+        self.analyze_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.progress_var.set(0)
+        self.progress_label.config(text="正在分析...")
+
+        # 在后台线程中分析，避免界面冻结
+        self.analysis_thread = threading.Thread(
+            target=self.analyze_log_thread,
+            args=(self.analyzer, paths, self.stop_event, self.parallel_var.get(), self.following),
+            daemon=True
+        )
+        self.analysis_thread.start()
+
+    def analyze_log_thread(self, analyzer, paths, stop_event, parallel=False, follow=False):
+        def report(a):
+            # 在工作线程里复制一份快照，再交给主线程刷新界面
+            snapshot = dict(a.error_stats)
+            templates = a.templates.summary() if a.templates is not None else None
+            self.root.after(0, self.update_progress, snapshot, a.source_read, a.total_size, templates)
+
+        try:
+            if follow:
+                LogFollower(paths[0], analyzer).follow(progress=report, stop_event=stop_event)
+            elif len(paths) > 1:
+                analyzer.analyze_series(paths, progress=report, stop_event=stop_event, parallel=parallel)
+            elif parallel:
+                analyzer.analyze_file_parallel(paths[0], progress=report, stop_event=stop_event)
+            else:
+                analyzer.analyze_file(paths[0], progress=report, stop_event=stop_event)
+            self.root.after(0, self.analysis_finished, analyzer, follow)
+        except Exception as e:
+            self.root.after(0, lambda: messagebox.showerror("错误", f"分析日志时出错: {str(e)}"))
+            self.root.after(0, self.reset_analysis_controls)
+
+    def update_progress(self, stats, bytes_read, total_size, templates=None):
+        """用部分统计结果原地刷新表格和进度条"""
+        # 跟踪的文件被轮转后，旧的错误类型可能已不存在
+        for error_type in list(self.stats_items):
+            if error_type not in stats:
+                self.stats_tree.delete(self.stats_items.pop(error_type))
+
+        for error_type, count in stats.items():
+            item = self.stats_items.get(error_type)
+            if item is None:
+                self.stats_items[error_type] = self.stats_tree.insert("", tk.END, values=(error_type, count))
+            else:
+                self.stats_tree.item(item, values=(error_type, count))
+
+        # 按数量重新排序
+        for index, (error_type, _) in enumerate(sorted(stats.items(), key=lambda x: x[1], reverse=True)):
+            self.stats_tree.move(self.stats_items[error_type], "", index)
+
+        # 用最新的模板替换各错误类型下的子行
+        for error_type, rows in (templates or {}).items():
+            parent = self.stats_items.get(error_type)
+            if parent is None:
+                continue
+            self.stats_tree.delete(*self.stats_tree.get_children(parent))
+            for text, count, line_no, offset in rows:
+                self.stats_tree.insert(parent, tk.END, values=(
+                    text, count, "" if line_no is None else line_no, "" if offset is None else offset))
+
+        if total_size:
+            self.progress_var.set(min(100.0, bytes_read * 100.0 / total_size))
+        self.progress_label.config(text=f"{bytes_read / 1048576:.0f} / {total_size / 1048576:.0f} MB")
+
+        # 跟踪模式下文件不断变长，行索引也要跟着增量更新
+        if self.following:
+            self.log_viewer.refresh()
+
+    def analysis_finished(self, analyzer, follow=False):
+        templates = analyzer.templates.summary() if analyzer.templates is not None else None
+        self.update_progress(dict(analyzer.error_stats), analyzer.source_read, analyzer.total_size, templates)
+        self.reset_analysis_controls()
+        self.log_viewer.refresh()
+        if follow:
+            self.progress_label.config(text="已停止跟踪")
+        elif analyzer.cancelled:
+            self.progress_label.config(text="已取消")
+            messagebox.showinfo("已取消", f"分析已取消，已找到 {analyzer.error_count} 条错误信息")
+        else:
+            self.progress_var.set(100)
+            self.progress_label.config(text="完成")
+            messagebox.showinfo("完成", f"日志分析完成，共找到 {analyzer.error_count} 条错误信息")
+
+    def reset_analysis_controls(self):
+        self.analyze_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+
+    def cancel_analysis(self):
+        """取消正在进行的分析"""
+        self.stop_event.set()
+        self.progress_label.config(text="正在取消...")
 
     def show_error_detail(self, event):
         selected_item = self.stats_tree.selection()
         if not selected_item:
             return
 
-        error_type = self.stats_tree.item(selected_item, "values")[0]
+        values = self.stats_tree.item(selected_item[0], "values")
+        if self.stats_tree.parent(selected_item[0]):
+            self.render_template_detail(values)
+            return
+        self.detail_type = values[0]
+        self.detail_page = 0
+        self.render_detail_page()
+
+    def render_template_detail(self, values):
+        """显示模板的出现次数和首次出现的示例行"""
+        text, count, line_no, offset = values
+        self.detail_type = None
+        self.render_detail_page()
+        self.detail_text.insert(tk.END, f"模板: {text}\n出现次数: {count}\n")
+        if line_no != "" and self.analyzer is not None:
+            line = next(self.analyzer.read_lines([int(offset)]), "")
+            self.detail_text.insert(tk.END, f"\n首次出现:\n{int(line_no) + 1}: {line.rstrip(chr(10))}\n")
+
+    def render_detail_page(self):
+        """从倒排列表中按页读取当前错误类型的命中行"""
         self.detail_text.delete(1.0, tk.END)
+        self.prev_btn.config(state=tk.DISABLED)
+        self.next_btn.config(state=tk.DISABLED)
+        self.page_label.config(text="")
 
-        # 显示该类型的所有错误
-        for line in self.error_lines:
-            line_lower = line.lower()
-            for kw in self.error_keywords:
-                if kw in line_lower and error_type.lower().startswith(kw):
-                    self.detail_text.insert(tk.END, line)
-                    break
+        if self.analyzer is None:
+            return
 
+        # 分析线程只会在列表末尾追加，这里按页切片读取即可
+        posting = self.analyzer.postings.get(self.detail_type)
+        if posting is None:
+            return
+
+        total_pages = (len(posting) + DETAIL_PAGE_SIZE - 1) // DETAIL_PAGE_SIZE
+        line_numbers, offsets = posting.page(self.detail_page, DETAIL_PAGE_SIZE)
+        for line_no, line in zip(line_numbers, self.analyzer.read_lines(offsets)):
+            self.detail_text.insert(tk.END, f"{line_no + 1}: {line.rstrip(chr(10))}\n")
+
+        self.page_label.config(text=f"第 {self.detail_page + 1}/{total_pages} 页")
+        if self.detail_page > 0:
+            self.prev_btn.config(state=tk.NORMAL)
+        if self.detail_page < total_pages - 1:
+            self.next_btn.config(state=tk.NORMAL)
+
+    def jump_to_detail_line(self, event):
+        """点击详情中的某一行时，在日志预览中跳转到该行"""
+        widget = event.widget
+        if widget.tag_ranges(tk.SEL):
+            return
+        # 轮转序列的行号跨越多个文件，预览中只有当前文件
+        if self.analyzer is not None and len(self.analyzer.sources) > 1:
+            return
+        index = widget.index(f"@{event.x},{event.y}")
+        text = widget.get(f"{index} linestart", f"{index} lineend")
+        m = re.match(r"(\d+): ", text)
+        if m:
+            self.log_viewer.goto(int(m.group(1)) - 1)
+
+    def show_time_histogram(self):
+        """显示每分钟的错误数量，并可按时间范围查询命中的行"""
+        if self.analyzer is None or self.analyzer.columns is None:
+            messagebox.showwarning("警告", "请先选择日志格式并完成分析")
+            return
+        analyzer = self.analyzer
+        columns = analyzer.columns
+
+        win = tk.Toplevel(self.root)
+        win.title("错误时间分布")
+        win.geometry("800x600")
+
+        # 查询条件
+        query_frame = ttk.Frame(win, padding=10)
+        query_frame.pack(fill=tk.X)
+        time_format = "%Y-%m-%d %H:%M:%S"
+        ttk.Label(query_frame, text="开始时间:").pack(side=tk.LEFT)
+        start_entry = ttk.Entry(query_frame, width=20)
+        start_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(query_frame, text="结束时间:").pack(side=tk.LEFT)
+        end_entry = ttk.Entry(query_frame, width=20)
+        end_entry.pack(side=tk.LEFT, padx=5)
+        type_var = tk.StringVar(value="全部")
+        ttk.Combobox(query_frame, textvariable=type_var, values=["全部"] + list(columns.types),
+                     state="readonly", width=16).pack(side=tk.LEFT, padx=5)
+
+        span = columns.time_span()
+        if span is not None:
+            start_entry.insert(0, datetime.fromtimestamp(span[0]).strftime(time_format))
+            end_entry.insert(0, datetime.fromtimestamp(span[1] + 1).strftime(time_format))
+
+        # 每分钟的错误数量
+        hist_tree = ttk.Treeview(win, columns=("minute", "count", "bar"), show="headings", height=12)
+        hist_tree.heading("minute", text="时间(分钟)")
+        hist_tree.heading("count", text="数量")
+        hist_tree.heading("bar", text="分布")
+        hist_tree.column("minute", width=150)
+        hist_tree.column("count", width=80)
+        hist_tree.column("bar", width=400)
+        hist_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        summary_label = ttk.Label(win, text="")
+        summary_label.pack(anchor=tk.W, padx=10)
+        result_text = tk.Text(win, height=12, wrap=tk.NONE)
+        result_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        result_text.bind("<ButtonRelease-1>", self.jump_to_detail_line)
+
+        def run_query():
+            try:
+                start = datetime.strptime(start_entry.get().strip(), time_format).timestamp() \
+                    if start_entry.get().strip() else None
+                end = datetime.strptime(end_entry.get().strip(), time_format).timestamp() \
+                    if end_entry.get().strip() else None
+            except ValueError:
+                messagebox.showerror("错误", f"时间格式应为 {time_format}", parent=win)
+                return
+            error_type = None if type_var.get() == "全部" else type_var.get()
+
+            hist_tree.delete(*hist_tree.get_children())
+            histogram = columns.histogram(60, start, end, error_type)
+            peak = max((count for _, count in histogram), default=1)
+            for minute, count in histogram:
+                hist_tree.insert("", tk.END, values=(
+                    datetime.fromtimestamp(minute).strftime("%Y-%m-%d %H:%M"),
+                    count,
+                    "█" * max(1, count * 40 // peak)
+                ))
+
+            # 只读取前一页命中行的内容
+            hits = columns.select(start, end, error_type)
+            summary_label.config(text=f"共 {len(hits)} 条，显示前 {min(len(hits), DETAIL_PAGE_SIZE)} 条")
+            result_text.delete(1.0, tk.END)
+            rows = [columns.row(i) for i in hits[:DETAIL_PAGE_SIZE]]
+            for row, line in zip(rows, analyzer.read_lines([r[2] for r in rows])):
+                timestamp, line_no, _, _, process, level = row
+                result_text.insert(tk.END, f"{line_no + 1}: [{datetime.fromtimestamp(timestamp):%H:%M:%S}] "
+                                           f"{process} {level} | {line.rstrip(chr(10))}\n")
+
+        ttk.Button(query_frame, text="查询", command=run_query).pack(side=tk.LEFT)
+        run_query()
+
+    def prev_detail_page(self):
+        if self.detail_page > 0:
+            self.detail_page -= 1
+            self.render_detail_page()
+
+    def next_detail_page(self):
+        self.detail_page += 1
+        self.render_detail_page()
 
 if __name__ == "__main__":
     # 根据是否支持拖放功能选择不同的 Tk 类
@@ -1,32 +1,714 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import asyncio
+import base64
+import heapq
+import queue
 import random
 import threading
+import time
+import traceback
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from tkinter import *
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import csv
 import json
+import math
 import os
-from urllib.parse import urlparse
+from itertools import chain
+from types import MappingProxyType
+from urllib.parse import urlparse, unquote
+
+try:
+    import resource
+except ImportError:  # Windows 没有文件描述符上限
+    resource = None
+
+# 批量测试代理时的总并发数，以及同一台代理主机(不同端口)同时测试的上限
+CHECK_WORKERS = 100
+CHECK_PER_HOST = 4
+# 操作日志至少积累这么多条、并且超过代理总数时，才合并进快照文件
+JOURNAL_COMPACT_MIN = 1000
+# 加权选择时响应时间的下限，避免极小的测量值占据全部权重
+MIN_SPEED = 0.01
+# 加权选择的别名表在代理变化数超过这个比例，或距上次重建超过这么多秒时重建
+WEIGHT_REBUILD_RATIO = 0.05
+WEIGHT_REBUILD_INTERVAL = 1.0
+# 批量导入时每测完这么多个代理提交一次
+IMPORT_BATCH = 500
+# 滚动健康统计：窗口大小、EWMA 平滑系数、判定为可用的最低成功率
+HEALTH_WINDOW = 20
+EWMA_ALPHA = 0.3
+HEALTHY_RATE = 0.5
+# 熔断：连续失败这么多次后暂停测试，等待时间从 BREAKER_BACKOFF 秒起按 2 的幂增长，最长 BREAKER_MAX_BACKOFF 秒
+BREAKER_FAILURES = 3
+BREAKER_BACKOFF = 60
+BREAKER_MAX_BACKOFF = 6 * 3600
+# 本地转发代理：默认监听地址，每个上游代理的并发上限，换上游重试的次数，
+# 空闲上游连接的保留时间、连接和等待响应头的超时(秒)，以及转发缓冲区大小
+FORWARD_HOST = "127.0.0.1"
+FORWARD_PORT = 8899
+UPSTREAM_LIMIT = 8
+FORWARD_RETRIES = 3
+IDLE_TIMEOUT = 30
+FORWARD_TIMEOUT = 10
+FORWARD_BUFFER = 64 * 1024
+# 转发时连续失败这么多次的上游暂停选用，暂停时间从 FORWARD_PENALTY 秒起按 2 的幂增长，最长 FORWARD_MAX_PENALTY 秒；
+# 只在本地转发代理内生效，不计入代理池基于测试的健康统计
+FORWARD_PENALTY_FAILURES = 3
+FORWARD_PENALTY = 10
+FORWARD_MAX_PENALTY = 300
+# 选上游时最多抽取几次来避开已试过或已满的代理
+PICK_ATTEMPTS = 8
+# 测试代理时为每个代理保留会话以复用连接，最多缓存这么多个；每个会话最多保持 2 个连接，
+# 实际上限还要按进程可打开的文件数计算，并为日志文件、界面等保留至少 FD_RESERVE 个(或软上限的 1/4)
+MAX_SESSIONS = 4096
+FD_RESERVE = 64
+# 后台健康检查：可用代理每 SWEEP_INTERVAL 秒测试一次，不可用的间隔乘以 SWEEP_FAILED_FACTOR；
+# 同时进行的测试数上限，调度的时间粒度(秒)，只影响统计、不改变可用状态的结果多久写入一次，
+# 界面多久(毫秒)取一次后台测试的结果，以及界面停止后台测试时最多等待多久(秒)
+SWEEP_INTERVAL = 300
+SWEEP_FAILED_FACTOR = 4
+SWEEP_WORKERS = 20
+SWEEP_TICK = 1.0
+SWEEP_PERSIST_INTERVAL = 60
+SWEEP_POLL_MS = 500
+SWEEP_STOP_TIMEOUT = 10
+
+
+PROXY_PROTOCOLS = ("http", "https", "socks4", "socks5")
+
+
+def session_limit():
+    """按 RLIMIT_NOFILE 的软上限算出可以缓存的会话数，避免空闲连接耗尽文件描述符"""
+    if resource is None:
+        return MAX_SESSIONS
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return MAX_SESSIONS
+    return max(8, min(MAX_SESSIONS, (soft - max(FD_RESERVE, soft // 4)) // 2))
+
+
+def normalize_proxy(text, protocol='http'):
+    """
+    把各种写法的代理地址统一成 协议://[用户:密码@]主机:端口，无法识别时返回 None。
+
+    :return: (代理地址, 协议)
+    """
+    text = text.strip().strip('"\'')
+    if not text:
+        return None
+    if '://' not in text:
+        text = f"{protocol}://{text}"
+    try:
+        parsed = urlparse(text)
+        port = parsed.port
+    except ValueError:
+        return None
+    scheme = parsed.scheme.lower()
+    if scheme not in PROXY_PROTOCOLS or not parsed.hostname or port is None:
+        return None
+    auth = text.split('://', 1)[1].rsplit('@', 1)[0] + '@' if parsed.username else ''
+    host = f"[{parsed.hostname}]" if ':' in parsed.hostname else parsed.hostname
+    return f"{scheme}://{auth}{host}:{port}", scheme
+
+
+def read_proxy_file(path, protocol='http'):
+    """
+    逐条读取代理列表文件，产出未经规范化的 (地址, 协议)。
+
+    支持三种格式：.json(地址字符串列表，或本工具保存的记录列表)、
+    .csv(有 proxy/address 列时取该列，可选 protocol 列；没有表头时第一列是地址、第二列是协议)、
+    其他按文本处理(每行一个或多个以空白分隔的地址，# 开头为注释)。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        if ext == '.json':
+            for item in json.load(f):
+                if isinstance(item, dict):
+                    yield item.get('proxy', ''), item.get('protocol') or protocol
+                else:
+                    yield str(item), protocol
+        elif ext == '.csv':
+            rows = csv.reader(f)
+            first = next(rows, [])
+            header = [name.strip().lower() for name in first]
+            column = next((header.index(name) for name in ('proxy', 'address') if name in header), None)
+            proto_column = header.index('protocol') if 'protocol' in header else None
+            if column is None:
+                # 没有表头：第一行原样作为数据(保留用户名密码的大小写)，第二列是协议
+                column, proto_column = 0, 1
+                rows = chain([first], rows)
+            for row in rows:
+                if len(row) > column:
+                    row_protocol = row[proto_column] if proto_column is not None and len(row) > proto_column else ''
+                    row_protocol = row_protocol.strip().lower()
+                    yield row[column], row_protocol if row_protocol in PROXY_PROTOCOLS else protocol
+        else:
+            for line in f:
+                line = line.split('#', 1)[0]
+                for token in line.split():
+                    yield token, protocol
+
+
+def new_record(proxy, protocol, is_ok, speed, test_url, timings=None):
+    """新建一条代理记录，并把第一次测试结果计入健康统计"""
+    record = {
+        'proxy': proxy,
+        'protocol': protocol,
+        'is_working': False,
+        'speed': 0,
+        'test_url': test_url,
+        'history': [],  # 最近 HEALTH_WINDOW 次测试的响应时间，失败为 None
+        'ewma': 0,  # 成功测试响应时间的指数加权平均
+        'failures': 0,  # 连续失败次数
+        'retry_at': 0,  # 熔断后允许再次测试的时间，0 表示未熔断
+        'checked_at': 0  # 最近一次测试的时间
+    }
+    if timings is not None:
+        record['timings'] = {name: round(value, 4) for name, value in timings.items()}  # 最近一次成功测试的各阶段耗时
+    record_result(record, is_ok, speed)
+    return record
+
+
+def record_result(record, is_ok, speed, now=None):
+    """
+    把一次测试结果计入滚动窗口，更新 EWMA 和熔断状态，再据此判断代理是否可用。
+
+    窗口内成功率不低于 HEALTHY_RATE 且未熔断才算可用，偶尔一次失败不会改变状态；
+    连续失败 BREAKER_FAILURES 次后熔断，之后每多失败一次，等待时间翻倍。
+    """
+    now = now or time.time()
+    record['checked_at'] = round(now, 3)
+    history = record.setdefault('history', [])
+    history.append(round(speed, 4) if is_ok else None)
+    del history[:-HEALTH_WINDOW]
+    if is_ok:
+        ewma = record.get('ewma') or speed
+        record['ewma'] = round(ewma + EWMA_ALPHA * (speed - ewma), 4)
+        record['failures'] = 0
+        record['retry_at'] = 0
+    else:
+        record['failures'] = record.get('failures', 0) + 1
+        if record['failures'] >= BREAKER_FAILURES:
+            backoff = min(BREAKER_BACKOFF * 2 ** (record['failures'] - BREAKER_FAILURES), BREAKER_MAX_BACKOFF)
+            record['retry_at'] = now + backoff
+    record['is_working'] = success_rate(record) >= HEALTHY_RATE and record['failures'] < BREAKER_FAILURES
+    record['speed'] = record.get('ewma', 0) if record['is_working'] else 0
+
+
+def success_rate(record):
+    """滚动窗口内的成功率；旧版本保存的记录没有历史，按上一次的状态计算"""
+    history = record.get('history')
+    if not history:
+        return 1.0 if record['is_working'] else 0.0
+    return sum(1 for latency in history if latency is not None) / len(history)
+
+
+def p95_latency(record):
+    """滚动窗口内成功测试响应时间的 95 分位数，没有成功记录时返回 None"""
+    latencies = sorted(latency for latency in record.get('history', ()) if latency is not None)
+    if not latencies:
+        return None
+    return latencies[math.ceil(0.95 * len(latencies)) - 1]
+
+
+def effective_speed(record):
+    """供选择策略使用的响应时间：EWMA 除以成功率，不太稳定的代理显得更慢"""
+    return record['speed'] / max(success_rate(record), 0.01)
+
+
+def breaker_open(record, now=None):
+    """代理是否处于熔断等待期"""
+    return record.get('retry_at', 0) > (now or time.time())
+
+
+class SelectionStrategy:
+    """
+    代理选择策略的基类：维护一组可用代理及其响应时间，select() 从中挑出一个。
+
+    add/remove 在代理的健康状态变化时调用，由代理池的写锁保证同一时间只有一个线程修改；
+    select 不加锁，可能与 add/remove 同时进行，只依赖单个列表/字典操作的原子性，读到刚变化的列表时重试。
+    add/remove/select 都应是 O(1)。
+    """
+
+    name = ""
+
+    def __init__(self):
+        self.items = []  # 代理地址
+        self.positions = {}  # 代理地址 -> 在 items 中的下标
+        self.speeds = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, proxy, speed):
+        if proxy not in self.positions:
+            self.positions[proxy] = len(self.items)
+            self.items.append(proxy)
+        self.speeds[proxy] = speed
+
+    def remove(self, proxy):
+        index = self.positions.pop(proxy, None)
+        if index is None:
+            return
+        # 用最后一个元素填补空位，删除是 O(1)
+        last = self.items.pop()
+        if last != proxy:
+            self.items[index] = last
+            self.positions[last] = index
+        self.speeds.pop(proxy, None)
+
+    def _pick(self):
+        """均匀随机取一个；列表恰好在取下标后被缩短时重试"""
+        items = self.items
+        while items:
+            try:
+                return items[random.randrange(len(items))]
+            except (IndexError, ValueError):
+                continue
+        return None
+
+    def select(self):
+        raise NotImplementedError
+
+
+class RandomStrategy(SelectionStrategy):
+    """均匀随机"""
+
+    name = "random"
+
+    def select(self):
+        return self._pick()
+
+
+class WeightedStrategy(SelectionStrategy):
+    """
+    按响应时间的倒数加权随机，越快的代理被选中的概率越大；使用别名表，每次选择 O(1)。
+
+    别名表建立在某一时刻的代理列表上，整体替换，选择时不需要加锁。代理状态变化后不立即重建，
+    而是在变化数超过 WEIGHT_REBUILD_RATIO 或距上次重建超过 WEIGHT_REBUILD_INTERVAL 秒时才重建，
+    健康状态频繁更新时重建的开销摊到每次选择上仍是 O(1)。表中已被移除的代理在选中时跳过。
+    """
+
+    name = "weighted"
+
+    def __init__(self):
+        super().__init__()
+        self.table = ((), (), ())  # (代理列表, 概率, 别名)
+        self.changes = 0
+        self.built_at = 0
+        self._building = threading.Lock()
+
+    def add(self, proxy, speed):
+        super().add(proxy, speed)
+        self.changes += 1
+
+    def remove(self, proxy):
+        super().remove(proxy)
+        self.changes += 1
+
+    def _build(self):
+        """Vose 别名法：把各代理的权重拆进 n 个等概率的桶，每个桶最多两个代理"""
+        self.changes = 0
+        self.built_at = time.monotonic()
+        items = list(self.items)
+        speeds = dict(self.speeds)
+        n = len(items)
+        if not n:
+            self.table = ((), (), ())
+            return
+        weights = [1 / max(speeds.get(proxy, 1.0), MIN_SPEED) for proxy in items]
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, w in enumerate(scaled) if w < 1]
+        large = [i for i, w in enumerate(scaled) if w >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        self.table = (items, prob, alias)
+
+    def _maybe_rebuild(self):
+        items = self.table[0]
+        stale = self.changes > len(items) * WEIGHT_REBUILD_RATIO or \
+            time.monotonic() - self.built_at > WEIGHT_REBUILD_INTERVAL
+        if self.changes and (not items or stale) and self._building.acquire(blocking=False):
+            # 其他线程正在重建时不等待，继续使用旧表
+            try:
+                self._build()
+            finally:
+                self._building.release()
+
+    def select(self):
+        self._maybe_rebuild()
+        items, prob, alias = self.table
+        for _ in range(PICK_ATTEMPTS):
+            if not items:
+                break
+            i = random.randrange(len(items))
+            proxy = items[i] if random.random() < prob[i] else items[alias[i]]
+            if proxy in self.positions:
+                return proxy
+        return self._pick()  # 表中的代理大多已被移除，退回均匀随机
+
+
+class PowerOfTwoStrategy(SelectionStrategy):
+    """随机抽两个代理，取响应时间较短的那个"""
+
+    name = "p2c"
+
+    def select(self):
+        a, b = self._pick(), self._pick()
+        if a is None or b is None:
+            return a or b
+        return a if self.speeds.get(a, math.inf) <= self.speeds.get(b, math.inf) else b
+
+
+class RoundRobinStrategy(SelectionStrategy):
+    """依次轮流使用每个代理"""
+
+    name = "round_robin"
+
+    def __init__(self):
+        super().__init__()
+        self.cursor = 0
+
+    def select(self):
+        items = self.items
+        cursor = self.cursor
+        self.cursor = cursor + 1
+        try:
+            return items[cursor % len(items)]
+        except (IndexError, ZeroDivisionError):
+            return self._pick()
+
+
+class LeastRecentStrategy(SelectionStrategy):
+    """选择最久没有被使用过的代理"""
+
+    name = "lru"
+
+    def __init__(self):
+        super().__init__()
+        self.order = OrderedDict()  # 最久未使用的在最前面
+
+    def add(self, proxy, speed):
+        self.speeds[proxy] = speed
+        if proxy not in self.order:
+            self.order[proxy] = None
+            self.order.move_to_end(proxy, last=False)  # 从未使用过，排在最前面
+
+    def remove(self, proxy):
+        self.speeds.pop(proxy, None)
+        self.order.pop(proxy, None)
+
+    def __len__(self):
+        return len(self.order)
+
+    def select(self):
+        for _ in range(PICK_ATTEMPTS):
+            try:
+                proxy = next(iter(self.order))
+                self.order.move_to_end(proxy)
+                return proxy
+            except StopIteration:
+                return None
+            except (KeyError, RuntimeError):
+                continue  # 取出后恰好被移除，或遍历时顺序被其他线程修改
+        return None
+
+
+SELECTION_STRATEGIES = {cls.name: cls for cls in (RandomStrategy, WeightedStrategy, PowerOfTwoStrategy,
+                                                  RoundRobinStrategy, LeastRecentStrategy)}
+
+
+# 记录当前线程最近一次新建连接的耗时，复用已有连接时不会更新
+_connect_timing = threading.local()
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """建立连接时记录耗时的 HTTP 连接"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """建立连接时记录耗时的 HTTPS 连接，经代理时包括 CONNECT 隧道和 TLS 握手"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """让经 HTTP 代理的请求使用上面的计时连接；SOCKS 代理仍用默认连接，不单独测量连接时间"""
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not proxy.lower().startswith('socks'):
+            manager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+        return manager
 
 
 class ProxyPool:
+    """
+    代理池：以代理地址为键的字典保存代理记录，另有按协议和按可用状态的索引，增删查都是 O(1)。
+
+    持久化分两部分：filename 是完整的快照(与旧版本格式相同的 JSON 列表)，
+    filename.journal 是追加写入的操作日志，每次修改只追加一行，日志过长时再合并进快照。
+
+    并发：所有修改都持有同一把写锁，依次进行；记录在修改时整体替换而不是原地修改，
+    读者拿到的记录不会变化，需要遍历时使用 snapshot() 返回的只读快照。选择代理不加锁。
+    """
+
     def __init__(self, filename="proxy_pool.json"):
         self.filename = filename
-        self.proxies = []
+        self.journal_filename = filename + ".journal"
+        self.records = {}  # 代理地址 -> 代理记录
+        self.by_protocol = defaultdict(set)  # 协议 -> 代理地址集合
+        self.by_status = {True: set(), False: set()}  # 是否可用 -> 代理地址集合
+        self._journal = []  # 尚未写入日志文件的操作
+        self._journal_count = 0  # 日志文件中已有的操作数
+        self._lock = threading.RLock()  # 写锁
+        self._batch = threading.local()  # 每个线程自己的批量修改层数
+        self._snapshot = None  # 最近一次生成的只读快照，修改后作废
+        self._selectors = {}  # (策略名, 协议) -> 只包含可用代理的选择策略实例
+        self.sessions = OrderedDict()  # 代理地址 -> requests.Session，按最近使用排序
+        self.max_sessions = session_limit()
+        self._sessions_lock = threading.Lock()
+        self.scheduler = None
         self.load_proxies()
 
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, proxy):
+        return proxy in self.records
+
+    def get(self, proxy):
+        """按代理地址查找记录，不存在时返回 None"""
+        return self.records.get(proxy)
+
+    def snapshot(self):
+        """所有代理记录的只读快照(代理地址 -> 记录)，没有修改时多次调用返回同一个对象"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = MappingProxyType(dict(self.records))
+                snapshot = self._snapshot
+        return snapshot
+
+    def _index(self, record):
+        self._snapshot = None
+        self.records[record['proxy']] = record
+        self.by_protocol[record['protocol']].add(record['proxy'])
+        self.by_status[bool(record['is_working'])].add(record['proxy'])
+        self._update_selectors(record)
+
+    def _unindex(self, proxy):
+        record = self.records.pop(proxy, None)
+        if record is not None:
+            self._snapshot = None
+            self.by_protocol[record['protocol']].discard(proxy)
+            self.by_status[bool(record['is_working'])].discard(proxy)
+            for (_, protocol), selector in self._selectors.items():
+                if protocol in (None, record['protocol']):
+                    selector.remove(proxy)
+        return record
+
+    def _update_selectors(self, record):
+        """健康状态变化时同步到已建立的选择策略：可用的加入，不可用的移除"""
+        proxy = record['proxy']
+        for (_, protocol), selector in self._selectors.items():
+            if protocol not in (None, record['protocol']):
+                continue
+            if record['is_working'] and proxy in self.records:
+                selector.add(proxy, effective_speed(record))
+            else:
+                selector.remove(proxy)
+
     def load_proxies(self):
+        """读取快照，再按顺序重放操作日志"""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        self._snapshot = None
+        self._selectors = {}
+        self.records = {}
+        self.by_protocol = defaultdict(set)
+        self.by_status = {True: set(), False: set()}
         if os.path.exists(self.filename):
             with open(self.filename, 'r') as f:
                 try:
-                    self.proxies = json.load(f)
+                    for record in json.load(f):
+                        self._index(record)
                 except json.JSONDecodeError:
-                    self.proxies = []
-        else:
-            self.proxies = []
+                    pass
+
+        self._journal = []
+        self._journal_count = 0
+        torn = False
+        if os.path.exists(self.journal_filename):
+            with open(self.journal_filename, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写到一半中断的最后一行：重写快照，免得后续追加的操作接在残行后面
+                        torn = True
+                        break
+                    if entry['op'] == 'put':
+                        self._unindex(entry['record']['proxy'])
+                        self._index(entry['record'])
+                    elif entry['op'] == 'del':
+                        self._unindex(entry['proxy'])
+                    self._journal_count += 1
+        if torn:
+            self.save_proxies()
 
     def save_proxies(self):
-        with open(self.filename, 'w') as f:
-            json.dump(self.proxies, f, indent=2)
+        """
+        把所有代理写成完整快照并清空操作日志。
+
+        先写临时文件再改名替换，中途出错或断电时原来的快照保持完整；
+        替换后、清空日志前中断也没关系，日志中的操作重放到新快照上结果不变。
+        """
+        with self._lock:
+            self._journal = []
+            temp_filename = self.filename + ".tmp"
+            with open(temp_filename, 'w') as f:
+                json.dump(list(self.records.values()), f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_filename, self.filename)
+            with open(self.journal_filename, 'w'):
+                pass
+            self._journal_count = 0
+
+    def _log(self, entry):
+        self._journal.append(entry)
+        if not getattr(self._batch, 'depth', 0):
+            self.flush()
+
+    def flush(self):
+        """把缓冲的操作一次性追加到日志文件；日志中的操作比代理数还多时改为重写快照"""
+        with self._lock:
+            if not self._journal:
+                return
+            if self._journal_count + len(self._journal) > max(JOURNAL_COMPACT_MIN, len(self.records)):
+                self.save_proxies()
+                return
+            with open(self.journal_filename, 'a') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in self._journal))
+            self._journal_count += len(self._journal)
+            self._journal = []
+
+    @contextmanager
+    def batch(self):
+        """
+        批量修改时使用：with pool.batch(): ...，当前线程在期间的操作在退出时一起写入。
+
+        不会在整个期间持有写锁，其他线程仍可修改；它们的修改会把已缓冲的操作一起写入。
+        """
+        self._batch.depth = getattr(self._batch, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            self._batch.depth -= 1
+            if not self._batch.depth:
+                self.flush()
+
+    def put(self, record):
+        """添加或替换一条代理记录，记录交给代理池后不应再修改"""
+        with self._lock:
+            self._unindex(record['proxy'])
+            self._index(record)
+            self._log({'op': 'put', 'record': record})
+
+    def update_status(self, proxy, is_ok, speed, test_url, timings=None, persist=True):
+        """
+        记录一次测试结果，返回更新后的记录，代理不存在时返回 None。
+
+        :param timings: probe_proxy 测得的各阶段耗时，保存在记录的 timings 字段中
+        :param persist: 为 False 时只更新内存，由调用方稍后用 persist_records 写入
+        """
+        with self._lock:
+            old = self.records.get(proxy)
+            if old is None:
+                return None
+            # 在副本上修改再替换，其他线程手中的旧记录保持不变
+            record = dict(old)
+            record['history'] = list(old.get('history', ()))
+            record_result(record, is_ok, speed)
+            record['test_url'] = test_url
+            if timings is not None:
+                record['timings'] = {name: round(value, 4) for name, value in timings.items()}
+            self.by_status[bool(old['is_working'])].discard(proxy)
+            self.by_status[bool(record['is_working'])].add(proxy)
+            self.records[proxy] = record
+            self._snapshot = None
+            self._update_selectors(record)
+            if persist:
+                self._log({'op': 'put', 'record': record})
+            return record
+
+    def persist_records(self, proxies):
+        """把一组代理的当前记录一次性写入操作日志，已被删除的跳过"""
+        with self._lock:
+            for proxy in proxies:
+                record = self.records.get(proxy)
+                if record is not None:
+                    self._journal.append({'op': 'put', 'record': record})
+            self.flush()
+
+    def start_scheduler(self, test_url='http://www.baidu.com', on_result=None, interval=SWEEP_INTERVAL,
+                        workers=SWEEP_WORKERS):
+        """启动后台健康检查，已在运行时先停止旧的"""
+        self.stop_scheduler()
+        self.scheduler = HealthScheduler(self, test_url, on_result, interval, workers)
+        self.scheduler.start()
+        return self.scheduler
+
+    def stop_scheduler(self, timeout=None):
+        """停止后台健康检查，并写入尚未保存的测试结果，最多等待 timeout 秒"""
+        if self.scheduler is not None:
+            self.scheduler.stop(timeout)
+            self.scheduler = None
+
+    def clear(self):
+        """清空代理池"""
+        for proxy in list(self.sessions):
+            self.close_session(proxy)
+        with self._lock:
+            self._snapshot = None
+            self._selectors = {}
+            self.records = {}
+            self.by_protocol = defaultdict(set)
+            self.by_status = {True: set(), False: set()}
+            self.save_proxies()
 
     def add_proxy(self, proxy, protocol='http', test_url='http://www.baidu.com'):
         """添加代理并测试其可用性"""
@@ -38,89 +720,774 @@ class ProxyPool:
             proxy = f"{protocol}://{proxy}"
 
         # 检查是否已存在
-        for p in self.proxies:
-            if p['proxy'] == proxy:
-                return False, "该代理已存在"
+        if proxy in self.records:
+            return False, "该代理已存在"
 
         # 测试代理
-        is_ok, speed = self.test_proxy(proxy, test_url)
-
-        if is_ok:
-            self.proxies.append({
-                'proxy': proxy,
-                'protocol': protocol,
-                'is_working': is_ok,
-                'speed': speed,
-                'test_url': test_url
-            })
-            self.save_proxies()
+        timings = self.probe_proxy(proxy, test_url)
+
+        if timings is not None:
+            speed = timings['total'] - timings['connect']
+            self.put(new_record(proxy, protocol, True, speed, test_url, timings))
             return True, f"代理添加成功，响应时间: {speed:.2f}s"
         else:
             return False, "代理测试失败"
 
     def remove_proxy(self, proxy):
         """移除代理"""
-        for i, p in enumerate(self.proxies):
-            if p['proxy'] == proxy:
-                self.proxies.pop(i)
-                self.save_proxies()
-                return True
-        return False
+        with self._lock:
+            if self._unindex(proxy) is None:
+                return False
+            self._log({'op': 'del', 'proxy': proxy})
+        self.close_session(proxy)
+        return True
+
+    def get_session(self, proxy):
+        """取该代理专用的会话，会话内的连接在多次测试之间保持复用；最多缓存 max_sessions 个，超出时关闭最久未用的"""
+        with self._sessions_lock:
+            session = self.sessions.pop(proxy, None)
+            if session is None:
+                session = requests.Session()
+                adapter = TimedAdapter(pool_connections=1, pool_maxsize=2)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.proxies = {'http': proxy, 'https': proxy}
+                session.trust_env = False  # 不受环境变量中代理设置的影响
+            self.sessions[proxy] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)[1].close()
+        return session
+
+    def close_session(self, proxy):
+        with self._sessions_lock:
+            session = self.sessions.pop(proxy, None)
+        if session is not None:
+            session.close()
+
+    def probe_proxy(self, proxy, test_url='http://www.baidu.com', timeout=5):
+        """
+        通过代理请求 test_url，分别测量各阶段的耗时，失败时返回 None。
+
+        :return: {'connect': 建立连接(含 TLS 和 CONNECT 隧道)的时间，复用连接时为 0,
+                  'ttfb': 发出请求到收到响应头的时间, 'total': 整个请求的时间}
+        """
+        session = self.get_session(proxy)
+        try:
+            _connect_timing.seconds = 0
+            start = time.perf_counter()
+            with session.get(test_url, timeout=timeout, stream=True) as response:
+                headers_at = time.perf_counter()
+                response.content
+                end = time.perf_counter()
+            if response.status_code != 200:
+                return None
+        except Exception:
+            self.close_session(proxy)  # 出错的连接状态不确定，下次重新建立
+            return None
+        connect = getattr(_connect_timing, 'seconds', 0)
+        return {'connect': connect, 'ttfb': headers_at - start - connect, 'total': end - start}
 
     def test_proxy(self, proxy, test_url='http://www.baidu.com', timeout=5):
-        """测试代理是否可用"""
-        try:
-            proxies = {
-                'http': proxy,
-                'https': proxy
-            }
-            start = time.time()
-            response = requests.get(test_url, proxies=proxies, timeout=timeout)
-            end = time.time()
-            if response.status_code == 200:
-                return True, end - start
-        except Exception as e:
-            pass
-        return False, 0
+        """测试代理是否可用，返回的响应时间不含建立连接的时间"""
+        timings = self.probe_proxy(proxy, test_url, timeout)
+        if timings is None:
+            return False, 0
+        return True, timings['total'] - timings['connect']
+
+    def check_proxies(self, proxies, test_url='http://www.baidu.com', timeout=5, workers=CHECK_WORKERS,
+                      per_host=CHECK_PER_HOST, stop_event=None):
+        """
+        用线程池并发测试一组代理，按完成的先后顺序产出 (proxy, is_ok, speed, timings)，timings 见 probe_proxy。
+
+        整轮测试的耗时约为 代理数 / workers 个超时时间，而不是所有超时时间之和。
+
+        :param workers: 同时进行的测试数量上限
+        :param per_host: 同一台代理主机同时进行的测试数量上限，避免把一台主机的所有端口同时压上去
+        :param stop_event: threading.Event，置位后不再开始新的测试，尚未测试的代理不会产出
+        """
+        # 按主机轮流排列，使排在前面的任务尽量分属不同主机，减少线程在主机信号量上空等
+        by_host = defaultdict(deque)
+        for proxy in proxies:
+            by_host[urlparse(proxy).hostname].append(proxy)
+        ordered = []
+        while by_host:
+            for host in list(by_host):
+                ordered.append(by_host[host].popleft())
+                if not by_host[host]:
+                    del by_host[host]
+        if not ordered:
+            return
 
-    def test_all_proxies(self, test_url='http://www.baidu.com'):
-        """测试所有代理"""
-        for proxy in self.proxies:
-            is_ok, speed = self.test_proxy(proxy['proxy'], test_url)
-            proxy['is_working'] = is_ok
-            proxy['speed'] = speed if is_ok else 0
-            proxy['test_url'] = test_url
-        self.save_proxies()
+        host_limits = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        limits_lock = threading.Lock()
+
+        def check(proxy):
+            if stop_event is not None and stop_event.is_set():
+                return None  # 取消了，不算测试失败
+            with limits_lock:
+                limit = host_limits[urlparse(proxy).hostname]
+            with limit:
+                timings = self.probe_proxy(proxy, test_url, timeout)
+            if timings is None:
+                return proxy, False, 0, None
+            return proxy, True, timings['total'] - timings['connect'], timings
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(ordered))) as executor:
+            futures = [executor.submit(check, proxy) for proxy in ordered]
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    yield result
+
+    def due_proxies(self, now=None):
+        """不在熔断等待期、需要测试的代理地址"""
+        now = now or time.time()
+        return [proxy for proxy, record in self.snapshot().items() if not breaker_open(record, now)]
+
+    def test_all_proxies(self, test_url='http://www.baidu.com', on_result=None, timeout=5, workers=CHECK_WORKERS,
+                         per_host=CHECK_PER_HOST, stop_event=None, proxies=None):
+        """
+        并发测试所有代理，结果在测试结束时一起写入。
+
+        :param on_result: 每测完一个代理就调用 on_result(代理记录)，用于实时刷新界面
+        :param proxies: 要测试的代理地址，默认为 due_proxies()，即跳过熔断中的代理
+        :return: 测试后仍可用的代理数量
+        """
+        if proxies is None:
+            proxies = self.due_proxies()
+        working = 0
+        with self.batch():
+            for proxy, is_ok, speed, timings in self.check_proxies(proxies, test_url, timeout, workers, per_host,
+                                                                   stop_event):
+                record = self.update_status(proxy, is_ok, speed, test_url, timings)
+                if record is None:  # 测试期间被删除了
+                    continue
+                working += record['is_working']
+                if on_result:
+                    on_result(record)
+        return working
+
+    def import_proxies(self, entries, test_url='http://www.baidu.com', validate=True, on_progress=None,
+                       timeout=5, workers=CHECK_WORKERS, per_host=CHECK_PER_HOST, stop_event=None,
+                       batch_size=IMPORT_BATCH):
+        """
+        批量导入代理：边读边规范化、去重，然后并发测试，每 batch_size 个结果提交一次。
+
+        :param entries: (地址, 协议) 的可迭代对象，例如 read_proxy_file() 的结果
+        :param validate: 为 False 时不测试，直接以"不可用"状态导入，等之后测试
+        :param on_progress: 每处理完一个代理调用 on_progress(已处理数, 总数, 已导入数, 新导入的记录或 None)
+        :return: (已导入数, 总数, 重复或无法识别的条目数)
+        """
+        pending = {}  # 代理地址 -> 协议
+        skipped = 0
+        for text, protocol in entries:
+            normalized = normalize_proxy(text, protocol)
+            if normalized is None or normalized[0] in self.records or normalized[0] in pending:
+                skipped += 1
+                continue
+            pending[normalized[0]] = normalized[1]
+
+        total = len(pending)
+        if validate:
+            results = self.check_proxies(list(pending), test_url, timeout, workers, per_host, stop_event)
+        else:
+            results = ((proxy, False, 0, None) for proxy in pending)
+
+        done = added = 0
+        with self.batch():
+            for proxy, is_ok, speed, timings in results:
+                done += 1
+                record = None
+                if is_ok or not validate:
+                    record = new_record(proxy, pending[proxy], is_ok, speed, test_url, timings)
+                    self.put(record)
+                    added += 1
+                if done % batch_size == 0:
+                    self.flush()
+                if on_progress:
+                    on_progress(done, total, added, record)
+        return added, total, skipped
+
+    def get_proxies(self, protocol=None, working_only=False):
+        """用索引筛选代理地址，返回新的集合"""
+        with self._lock:
+            candidates = set(self.by_status[True]) if working_only else set(self.records)
+            if protocol:
+                candidates &= self.by_protocol.get(protocol, set())
+            return candidates
+
+    def select_proxy(self, protocol=None, strategy="random"):
+        """
+        按策略从可用代理中选择一个，没有可用代理时返回 None。
+
+        每种(策略, 协议)组合第一次使用时建立选择结构，之后随健康状态增量更新。
+
+        :param strategy: SELECTION_STRATEGIES 中的名称
+        """
+        key = (strategy, protocol or None)
+        selector = self._selectors.get(key)
+        if selector is None:
+            # 建立时持有写锁，保证不漏掉同时发生的状态变化；之后的选择不加锁
+            with self._lock:
+                selector = self._selectors.get(key)
+                if selector is None:
+                    selector = SELECTION_STRATEGIES[strategy]()
+                    for proxy in self.get_proxies(protocol, working_only=True):
+                        selector.add(proxy, effective_speed(self.records[proxy]))
+                    self._selectors[key] = selector
+        return selector.select()
 
     def get_random_proxy(self, protocol=None, working_only=True):
         """随机获取一个代理"""
-        candidates = []
-        for p in self.proxies:
-            if working_only and not p['is_working']:
-                continue
-            if protocol and p['protocol'] != protocol:
-                continue
-            candidates.append(p['proxy'])
-
+        if working_only:
+            return self.select_proxy(protocol)
+        candidates = self.get_proxies(protocol)
         if candidates:
-            return random.choice(candidates)
+            return random.choice(tuple(candidates))
         return None
 
     def get_all_proxies(self):
         """获取所有代理"""
-        return self.proxies.copy()
+        return list(self.snapshot().values())
+
+
+class HealthScheduler:
+    """
+    后台健康检查：按每个代理的到期时间排队，匀速地持续测试，而不是隔一段时间集中测试全部代理。
+
+    到期时间 = 上次测试时间 + 间隔：可用代理间隔 interval，不可用的间隔更长，熔断中的等到熔断结束。
+    每秒开始的测试数按 代理数 / interval 限速，第一次调度时把从未测试过的代理随机分散到一个间隔内。
+    可用状态或熔断状态变化的结果每秒写入一次，只影响统计的结果每 SWEEP_PERSIST_INTERVAL 秒合并写入一次。
+    """
+
+    def __init__(self, pool, test_url, on_result=None, interval=SWEEP_INTERVAL, workers=SWEEP_WORKERS,
+                 timeout=5):
+        self.pool = pool
+        self.test_url = test_url
+        self.on_result = on_result
+        self.interval = interval
+        self.workers = workers
+        self.timeout = timeout
+        self.heap = []  # [(到期时间, 代理地址)]，代理被其他途径测试后可能过时，出队时再核对
+        self.scheduled = set()
+        self.results = queue.Queue()  # 工作线程把结果放进来，由调度线程统一更新代理池
+        self.in_flight = 0
+        self.dirty = set()  # 已更新但尚未写入的代理
+        self.checks = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.executor = None
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """停止调度，等待调度线程写入剩余结果，最多等待 timeout 秒(None 为一直等待)"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)  # 超时后调度线程仍会在后台写完剩余结果
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def next_due(self, record):
+        """代理下一次应当测试的时间"""
+        interval = self.interval if record['is_working'] else self.interval * SWEEP_FAILED_FACTOR
+        return max(record.get('checked_at', 0) + interval, record.get('retry_at', 0))
+
+    def _schedule_new(self, now):
+        """把还没排队的代理加入队列，从未测试过的随机分散到接下来的一个间隔内"""
+        for proxy, record in self.pool.snapshot().items():
+            if proxy in self.scheduled:
+                continue
+            due = now + random.uniform(0, self.interval) if not record.get('checked_at') else self.next_due(record)
+            heapq.heappush(self.heap, (due, proxy))
+            self.scheduled.add(proxy)
+
+    def _check(self, proxy):
+        try:
+            timings = self.pool.probe_proxy(proxy, self.test_url, self.timeout)
+        except Exception:
+            timings = None
+        self.results.put((proxy, timings))  # 无论如何都放回结果，保证 in_flight 能减回来
+
+    def _apply_results(self):
+        """在调度线程中处理已完成的测试，返回需要立即写入的代理"""
+        changed = []
+        while True:
+            try:
+                proxy, timings = self.results.get_nowait()
+            except queue.Empty:
+                return changed
+            self.in_flight -= 1
+            self.checks += 1
+            before = self.pool.get(proxy)
+            if before is None:
+                self.scheduled.discard(proxy)
+                continue
+            state = (before['is_working'], breaker_open(before))
+            is_ok = timings is not None
+            speed = timings['total'] - timings['connect'] if is_ok else 0
+            record = self.pool.update_status(proxy, is_ok, speed, self.test_url, timings, persist=False)
+            if record is None:  # 核对之后被其他线程删除了
+                self.scheduled.discard(proxy)
+                continue
+            if (record['is_working'], breaker_open(record)) != state:
+                changed.append(proxy)
+            else:
+                self.dirty.add(proxy)
+            heapq.heappush(self.heap, (self.next_due(record), proxy))
+            # 停止后不再回调：调用方可能正在等待本线程结束，回调里再等它就会互相卡住
+            if self.on_result and not self.stop_event.is_set():
+                self.on_result(record)
+
+    def _run(self):
+        now = time.time()
+        self._schedule_new(now)
+        budget = 0.0
+        last = now
+        last_rescan = last_persist = now
+        while not self.stop_event.is_set():
+            try:
+                now = time.time()
+                changed = self._apply_results()
+                if changed:
+                    self.pool.persist_records(changed)
+                    self.dirty.difference_update(changed)
+                if now - last_persist >= SWEEP_PERSIST_INTERVAL and self.dirty:
+                    self.pool.persist_records(self.dirty)
+                    self.dirty = set()
+                    last_persist = now
+                if now - last_rescan >= SWEEP_TICK * 10:
+                    self._schedule_new(now)  # 期间新加入的代理
+                    last_rescan = now
+
+                # 令牌桶：每秒补充 代理数 / interval 个测试名额，最多攒两个调度周期的量
+                rate = max(len(self.pool), 1) / self.interval
+                budget = min(budget + rate * (now - last), max(rate * SWEEP_TICK * 2, 1))
+                last = now
+                while budget >= 1 and self.heap and self.heap[0][0] <= now and self.in_flight < self.workers:
+                    due, proxy = heapq.heappop(self.heap)
+                    record = self.pool.get(proxy)
+                    if record is None:
+                        self.scheduled.discard(proxy)
+                        continue
+                    if record.get('checked_at') and self.next_due(record) > due + 1:
+                        heapq.heappush(self.heap, (self.next_due(record), proxy))  # 期间已经被测试过了
+                        continue
+                    self.in_flight += 1
+                    budget -= 1
+                    self.executor.submit(self._check, proxy)
+            except Exception:
+                # 单个结果出错(例如界面回调失败)不能让后台检查线程退出
+                traceback.print_exc()
+            self.stop_event.wait(SWEEP_TICK)
+
+        self._apply_results()
+        self.pool.persist_records(self.dirty)
+
+
+HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "proxy-authorization", "proxy-authenticate", "te",
+               "trailer", "upgrade", "expect"}
+
+
+async def read_head(reader):
+    """读取 HTTP 消息头，返回 (起始行, [(名称, 值), ...])；连接在消息开始前关闭时返回 (None, None)"""
+    start = await reader.readline()
+    if not start:
+        return None, None
+    headers = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("消息头不完整")
+        if line in (b"\r\n", b"\n"):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip(), value.strip()))
+    return start.decode("latin-1").rstrip("\r\n"), headers
+
+
+def header_value(headers, name):
+    """按名称(不区分大小写)取头部的值，没有时返回空字符串"""
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return ""
+
+
+def has_framed_body(headers):
+    return "chunked" in header_value(headers, "transfer-encoding").lower() or bool(
+        header_value(headers, "content-length"))
+
+
+async def iter_body(reader, headers, until_eof=False):
+    """
+    逐块产出消息体的原始字节，分块编码原样保留。
+
+    :param until_eof: 既没有 Content-Length 也不是分块编码时，是否一直读到连接关闭(响应如此，请求没有消息体)
+    """
+    if "chunked" in header_value(headers, "transfer-encoding").lower():
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("分块编码不完整")
+            yield line
+            size = int(line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                break
+            yield await reader.readexactly(size + 2)
+        while True:  # 末尾的 trailer 以空行结束
+            line = await reader.readline()
+            yield line
+            if line in (b"\r\n", b"\n", b""):
+                break
+    elif header_value(headers, "content-length"):
+        remaining = int(header_value(headers, "content-length"))
+        while remaining > 0:
+            data = await reader.read(min(remaining, FORWARD_BUFFER))
+            if not data:
+                raise ConnectionError("消息体不完整")
+            remaining -= len(data)
+            yield data
+    elif until_eof:
+        while True:
+            data = await reader.read(FORWARD_BUFFER)
+            if not data:
+                break
+            yield data
+
+
+def encode_head(start, headers):
+    lines = [start] + [f"{name}: {value}" for name, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def pipe(reader, writer):
+    """把一个方向的数据原样转发，直到对端关闭"""
+    try:
+        while True:
+            data = await reader.read(FORWARD_BUFFER)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        if writer.can_write_eof() and not writer.is_closing():
+            try:
+                writer.write_eof()
+            except OSError:
+                pass
+
+
+class UpstreamError(Exception):
+    """上游代理连接失败或在返回响应头之前断开，可以换一个上游重试"""
+
+
+class ForwardProxyServer:
+    """
+    本地 HTTP 转发代理：客户端把代理设为 127.0.0.1:端口，每个请求由代理池按策略选出的上游代理转发。
+
+    普通 HTTP 请求的上游连接在响应结束后放回空闲池复用；HTTPS 通过 CONNECT 建立隧道。
+    上游连接失败时换另一个上游重试；连续失败 FORWARD_PENALTY_FAILURES 次的上游暂停选用一段时间，
+    成功一次即恢复。转发结果不写入代理池，代理是否可用仍由测试决定。每个上游同时处理的请求数有上限。
+    只支持 http/https 类型的上游代理。
+    """
+
+    def __init__(self, pool, host=FORWARD_HOST, port=FORWARD_PORT, protocol='http', strategy='weighted',
+                 upstream_limit=UPSTREAM_LIMIT, retries=FORWARD_RETRIES):
+        if protocol not in ('http', 'https'):
+            raise ValueError(f"本地转发代理不支持 {protocol} 类型的上游代理")
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.strategy = strategy
+        self.upstream_limit = upstream_limit
+        self.retries = retries
+        self.idle = defaultdict(deque)  # 上游代理 -> [(reader, writer, 放回时间)]
+        self.limits = {}  # 上游代理 -> asyncio.Semaphore
+        self.penalties = {}  # 上游代理 -> [连续失败次数, 暂停到的时间(monotonic)]
+        self.clients = set()  # 正在处理的客户端连接
+        self.requests = 0
+        self.failures = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """在后台线程中启动事件循环，监听成功后返回，端口被占用等错误直接抛出"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self.handle_client, self.host, self.port))
+                self.port = self.server.sockets[0].getsockname()[1]
+            except OSError as e:
+                errors.append(e)
+                started.set()
+                self.loop.close()
+                return
+            started.set()
+            try:
+                self.loop.run_until_complete(self.server.serve_forever())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                # 停止时关闭仍在处理中的客户端连接，让各自的处理协程读到连接结束后退出
+                for writer in list(self.clients):
+                    writer.close()
+                self._close_idle()
+                tasks = asyncio.all_tasks(self.loop)
+                if tasks:
+                    self.loop.run_until_complete(asyncio.wait(tasks, timeout=FORWARD_TIMEOUT))
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+
+    def stop(self):
+        """停止监听并关闭空闲的上游连接"""
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.thread.join(5)
+        self.server = None
+
+    def _close_idle(self):
+        for connections in self.idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+        self.idle.clear()
+
+    def _limit(self, upstream):
+        limit = self.limits.get(upstream)
+        if limit is None:
+            limit = self.limits[upstream] = asyncio.Semaphore(self.upstream_limit)
+        return limit
+
+    def pick_upstream(self, tried):
+        """
+        按策略选一个还没试过的上游，尽量避开暂停中和已达并发上限的；
+        都忙时返回其中一个，由调用方排队等待，只剩暂停中的时也返回其中一个
+        """
+        busy = penalized = None
+        now = time.monotonic()
+        for _ in range(PICK_ATTEMPTS):
+            upstream = self.pool.select_proxy(self.protocol, self.strategy)
+            if upstream is None:
+                break
+            if upstream in tried:
+                continue
+            penalty = self.penalties.get(upstream)
+            if penalty is not None and penalty[1] > now:
+                penalized = penalized or upstream
+                continue
+            if not self._limit(upstream).locked():
+                return upstream
+            busy = busy or upstream
+        return busy or penalized
+
+    async def _connect(self, upstream):
+        """取一个到上游的连接：优先复用空闲连接，返回 (reader, writer, 是否复用)"""
+        connections = self.idle[upstream]
+        now = time.monotonic()
+        while connections:
+            reader, writer, since = connections.pop()
+            if now - since < IDLE_TIMEOUT and not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        parsed = urlparse(upstream)
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(parsed.hostname, parsed.port, ssl=parsed.scheme == 'https' or None),
+                FORWARD_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise UpstreamError(f"无法连接上游代理 {upstream}: {e}") from e
+        return reader, writer, False
+
+    def _release(self, upstream, reader, writer, reusable):
+        if reusable and not reader.at_eof():
+            self.idle[upstream].append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    def _upstream_headers(self, upstream, headers):
+        """去掉逐跳头部，补上到上游的保持连接和认证头"""
+        result = [(name, value) for name, value in headers if name.lower() not in HOP_HEADERS]
+        result.append(("Connection", "keep-alive"))
+        return result + self._proxy_auth(upstream)
+
+    def _proxy_auth(self, upstream):
+        """上游代理地址中带有用户名密码时，生成对应的 Proxy-Authorization 头"""
+        parsed = urlparse(upstream)
+        if not parsed.username:
+            return []
+        token = base64.b64encode(f"{unquote(parsed.username)}:{unquote(parsed.password or '')}".encode())
+        return [("Proxy-Authorization", "Basic " + token.decode())]
+
+    def _report_failure(self, upstream):
+        """记一次转发失败，连续失败过多时暂停选用这个上游，之后每多失败一次暂停时间翻倍"""
+        self.failures += 1
+        penalty = self.penalties.setdefault(upstream, [0, 0])
+        penalty[0] += 1
+        if penalty[0] >= FORWARD_PENALTY_FAILURES:
+            backoff = min(FORWARD_PENALTY * 2 ** (penalty[0] - FORWARD_PENALTY_FAILURES), FORWARD_MAX_PENALTY)
+            penalty[1] = time.monotonic() + backoff
+
+    def _report_success(self, upstream):
+        self.penalties.pop(upstream, None)
+
+    async def handle_client(self, client_reader, client_writer):
+        """处理一个客户端连接，支持在同一连接上连续发送多个请求"""
+        self.clients.add(client_writer)
+        try:
+            while True:
+                start, headers = await read_head(client_reader)
+                if start is None:
+                    break
+                method, target, version = start.split(" ", 2)
+                self.requests += 1
+                if method.upper() == "CONNECT":
+                    await self._tunnel(target, version, client_reader, client_writer)
+                    break
+                if not await self._forward(start, method, version, headers, client_reader, client_writer):
+                    break
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.clients.discard(client_writer)
+            client_writer.close()
+
+    async def _forward(self, start, method, version, headers, client_reader, client_writer):
+        """转发一个普通请求，返回客户端连接是否还能继续使用"""
+        keep_alive = version == "HTTP/1.1" and header_value(headers, "connection").lower() != "close" and \
+            header_value(headers, "proxy-connection").lower() != "close"
+        if header_value(headers, "expect").lower() == "100-continue":
+            client_writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        # 先读完请求体，换上游重试时要重新发送
+        body = b"".join([part async for part in iter_body(client_reader, headers)])
+
+        tried = set()
+        attempts = 0
+        while attempts < self.retries:
+            upstream = self.pick_upstream(tried)
+            if upstream is None:
+                break
+            tried.add(upstream)
+            attempts += 1
+            async with self._limit(upstream):
+                while True:
+                    try:
+                        reader, writer, reused = await self._connect(upstream)
+                    except UpstreamError:
+                        self._report_failure(upstream)
+                        break
+                    try:
+                        writer.write(encode_head(start, self._upstream_headers(upstream, headers)) + body)
+                        await writer.drain()
+                        status_line, response_headers = await asyncio.wait_for(read_head(reader), FORWARD_TIMEOUT)
+                        if status_line is None:
+                            raise ConnectionError("上游代理关闭了连接")
+                    except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                        writer.close()
+                        if reused:
+                            continue  # 空闲连接已被上游关闭，换一个新连接再试，不算上游故障
+                        self._report_failure(upstream)
+                        break
+                    self._report_success(upstream)
+                    return await self._relay_response(method, keep_alive, status_line, response_headers, upstream,
+                                                      reader, writer, client_writer)
+
+        client_writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await client_writer.drain()
+        return False
+
+    async def _relay_response(self, method, keep_alive, status_line, headers, upstream, reader, writer,
+                              client_writer):
+        """把上游的响应原样转给客户端，结束后决定上游连接能否复用"""
+        status = int(status_line.split(" ", 2)[1])
+        has_body = method.upper() != "HEAD" and status not in (204, 304) and not 100 <= status < 200
+        framed = not has_body or has_framed_body(headers)
+        upstream_reusable = framed and header_value(headers, "connection").lower() != "close"
+        keep_alive = keep_alive and framed
+        out_headers = [(name, value) for name, value in headers
+                       if name.lower() not in ("connection", "keep-alive", "proxy-connection")]
+        out_headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+        client_writer.write(encode_head(status_line, out_headers))
+        finished = False
+        try:
+            if has_body:
+                async for part in iter_body(reader, headers, until_eof=True):
+                    client_writer.write(part)
+                    await client_writer.drain()
+            await client_writer.drain()
+            finished = True
+        finally:
+            # 响应没有完整转发时，上游连接的状态不确定，不能复用
+            self._release(upstream, reader, writer, finished and upstream_reusable)
+        return keep_alive
+
+    async def _tunnel(self, target, version, client_reader, client_writer):
+        """处理 CONNECT：通过上游代理建立到目标的隧道，然后双向转发"""
+        tried = set()
+        for _ in range(self.retries):
+            upstream = self.pick_upstream(tried)
+            if upstream is None:
+                break
+            tried.add(upstream)
+            async with self._limit(upstream):
+                try:
+                    reader, writer, _ = await self._connect(upstream)
+                except UpstreamError:
+                    self._report_failure(upstream)
+                    continue
+                try:
+                    request = [("Host", target)] + self._proxy_auth(upstream)
+                    writer.write(encode_head(f"CONNECT {target} HTTP/1.1", request))
+                    await writer.drain()
+                    status_line, _ = await asyncio.wait_for(read_head(reader), FORWARD_TIMEOUT)
+                    if status_line is None or status_line.split(" ", 2)[1] != "200":
+                        raise ConnectionError(f"上游代理拒绝了 CONNECT: {status_line}")
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, IndexError):
+                    writer.close()
+                    self._report_failure(upstream)
+                    continue
+                self._report_success(upstream)
+                client_writer.write(f"{version} 200 Connection Established\r\n\r\n".encode("latin-1"))
+                await client_writer.drain()
+                try:
+                    await asyncio.gather(pipe(client_reader, writer), pipe(reader, client_writer))
+                finally:
+                    writer.close()
+                return
+        client_writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await client_writer.drain()
 
 
 class ProxyPoolGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("简单代理池工具 v1.0")
-        self.root.geometry("800x600")
+        self.root.geometry("900x600")
 
         self.proxy_pool = ProxyPool()
+        self.forward_server = None
+        self.sweep_results = queue.Queue()  # 后台测试线程放入结果，由主线程定时取出刷新列表
+        self.sweep_poll = None
 
         self.create_widgets()
         self.update_proxy_list()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_widgets(self):
         # 顶部框架 - 添加代理
@@ -145,23 +1512,30 @@ class ProxyPoolGUI:
         self.add_btn = Button(top_frame, text="添加并测试", command=self.add_proxy)
         self.add_btn.grid(row=1, column=3, padx=5, pady=5)
 
+        self.import_btn = Button(top_frame, text="批量导入", command=self.import_proxies)
+        self.import_btn.grid(row=1, column=4, padx=5, pady=5)
+
         # 中间框架 - 代理列表
         mid_frame = LabelFrame(self.root, text="代理列表", padx=5, pady=5)
         mid_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
 
-        columns = ("proxy", "protocol", "status", "speed", "test_url")
+        columns = ("proxy", "protocol", "status", "speed", "success", "p95", "test_url")
         self.proxy_tree = ttk.Treeview(mid_frame, columns=columns, show="headings")
 
         self.proxy_tree.heading("proxy", text="代理地址")
         self.proxy_tree.heading("protocol", text="协议")
         self.proxy_tree.heading("status", text="状态")
         self.proxy_tree.heading("speed", text="响应时间(s)")
+        self.proxy_tree.heading("success", text="成功率")
+        self.proxy_tree.heading("p95", text="p95(s)")
         self.proxy_tree.heading("test_url", text="测试URL")
 
         self.proxy_tree.column("proxy", width=200)
         self.proxy_tree.column("protocol", width=80)
         self.proxy_tree.column("status", width=80)
         self.proxy_tree.column("speed", width=100)
+        self.proxy_tree.column("success", width=70)
+        self.proxy_tree.column("p95", width=70)
         self.proxy_tree.column("test_url", width=200)
 
         self.proxy_tree.pack(fill=BOTH, expand=True, padx=5, pady=5)
@@ -180,12 +1554,28 @@ class ProxyPoolGUI:
         self.test_all_btn = Button(bottom_frame, text="测试所有代理", command=self.test_all_proxies)
         self.test_all_btn.pack(side=LEFT, padx=5)
 
-        self.get_random_btn = Button(bottom_frame, text="获取随机代理", command=self.get_random_proxy)
+        self.get_random_btn = Button(bottom_frame, text="获取代理", command=self.get_random_proxy)
         self.get_random_btn.pack(side=LEFT, padx=5)
 
+        Label(bottom_frame, text="选择策略:").pack(side=LEFT, padx=5)
+        self.strategy_var = StringVar(value="weighted")
+        self.strategy_menu = OptionMenu(bottom_frame, self.strategy_var, *SELECTION_STRATEGIES)
+        self.strategy_menu.pack(side=LEFT)
+
         self.clear_btn = Button(bottom_frame, text="清空代理池", command=self.clear_proxy_pool)
         self.clear_btn.pack(side=RIGHT, padx=5)
 
+        self.sweep_var = BooleanVar(value=False)
+        Checkbutton(bottom_frame, text="后台自动测试", variable=self.sweep_var,
+                    command=self.toggle_scheduler).pack(side=LEFT, padx=5)
+
+        self.forward_btn = Button(bottom_frame, text="启动本地代理", command=self.toggle_forward_server)
+        self.forward_btn.pack(side=RIGHT, padx=5)
+        self.forward_port_entry = Entry(bottom_frame, width=6)
+        self.forward_port_entry.insert(0, str(FORWARD_PORT))
+        self.forward_port_entry.pack(side=RIGHT)
+        Label(bottom_frame, text="本地端口:").pack(side=RIGHT, padx=5)
+
         # 状态栏
         self.status_var = StringVar()
         self.status_var.set("就绪")
@@ -196,15 +1586,30 @@ class ProxyPoolGUI:
         """更新代理列表显示"""
         self.proxy_tree.delete(*self.proxy_tree.get_children())
         for proxy in self.proxy_pool.get_all_proxies():
+            self.proxy_tree.insert("", "end", iid=proxy['proxy'], values=self.proxy_row(proxy))
+
+    def proxy_row(self, proxy):
+        """代理记录在列表中显示的各列"""
+        if breaker_open(proxy):
+            status = "熔断中"
+        else:
             status = "可用" if proxy['is_working'] else "不可用"
-            speed = f"{proxy['speed']:.2f}" if proxy['is_working'] else "N/A"
-            self.proxy_tree.insert("", "end", values=(
-                proxy['proxy'],
-                proxy['protocol'],
-                status,
-                speed,
-                proxy['test_url']
-            ))
+        speed = f"{proxy['speed']:.2f}" if proxy['is_working'] else "N/A"
+        p95 = p95_latency(proxy)
+        return (proxy['proxy'], proxy['protocol'], status, speed, f"{success_rate(proxy):.0%}",
+                "N/A" if p95 is None else f"{p95:.2f}", proxy['test_url'])
+
+    def update_proxy_row(self, proxy):
+        """只刷新一个代理所在的行，批量测试时每测完一个就调用一次"""
+        if self.proxy_tree.exists(proxy['proxy']):
+            self.proxy_tree.item(proxy['proxy'], values=self.proxy_row(proxy))
+
+    def insert_proxy_row(self, proxy):
+        """在列表末尾添加一个代理，已存在时只刷新"""
+        if self.proxy_tree.exists(proxy['proxy']):
+            self.update_proxy_row(proxy)
+        else:
+            self.proxy_tree.insert("", "end", iid=proxy['proxy'], values=self.proxy_row(proxy))
 
     def show_context_menu(self, event):
         """显示右键菜单"""
@@ -240,6 +1645,43 @@ class ProxyPoolGUI:
 
         threading.Thread(target=add_proxy_thread, daemon=True).start()
 
+    def import_proxies(self):
+        """从文本、CSV 或 JSON 文件批量导入代理，并发测试后分批保存"""
+        path = filedialog.askopenfilename(
+            title="选择代理列表文件",
+            filetypes=[("代理列表", "*.txt *.csv *.json"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        protocol = self.protocol_var.get()
+        test_url = self.test_url_entry.get().strip()
+
+        self.status_var.set("正在读取代理列表...")
+        self.import_btn.config(state=DISABLED)
+
+        def on_progress(done, total, added, record):
+            # 在工作线程中调用：新导入的代理逐个加入列表，状态栏每 50 个刷新一次
+            if record is not None:
+                row = dict(record)
+                self.root.after(0, lambda: self.insert_proxy_row(row))
+            if done % 50 == 0 or done == total:
+                self.root.after(0, lambda: self.status_var.set(f"正在导入: 已测试 {done}/{total}，可用 {added}"))
+
+        def import_thread():
+            try:
+                added, total, skipped = self.proxy_pool.import_proxies(read_proxy_file(path, protocol), test_url,
+                                                                       on_progress=on_progress)
+                self.root.after(0, lambda: messagebox.showinfo(
+                    "导入完成", f"共 {total} 个新代理，导入可用代理 {added} 个，跳过重复或无法识别的 {skipped} 条"))
+            except Exception as e:
+                msg = f"导入代理失败: {str(e)}"
+                self.root.after(0, lambda: messagebox.showerror("错误", msg))
+            finally:
+                self.root.after(0, lambda: self.status_var.set("就绪"))
+                self.root.after(0, lambda: self.import_btn.config(state=NORMAL))
+
+        threading.Thread(target=import_thread, daemon=True).start()
+
     def test_selected_proxy(self):
         """测试选中的代理"""
         selected = self.proxy_tree.selection()
@@ -257,21 +1699,17 @@ class ProxyPoolGUI:
 
         def test_proxy_thread():
             try:
-                is_ok, speed = self.proxy_pool.test_proxy(proxy, test_url)
+                timings = self.proxy_pool.probe_proxy(proxy, test_url)
+                is_ok = timings is not None
+                speed = timings['total'] - timings['connect'] if is_ok else 0
 
                 # 更新代理状态
-                for p in self.proxy_pool.proxies:
-                    if p['proxy'] == proxy:
-                        p['is_working'] = is_ok
-                        p['speed'] = speed if is_ok else 0
-                        p['test_url'] = test_url
-                        break
-
-                self.proxy_pool.save_proxies()
+                self.proxy_pool.update_status(proxy, is_ok, speed, test_url, timings)
 
                 msg = f"代理测试 {'成功' if is_ok else '失败'}"
                 if is_ok:
-                    msg += f"，响应时间: {speed:.2f}s"
+                    msg += (f"，响应时间: {speed:.2f}s\n建立连接: {timings['connect']:.3f}s，"
+                            f"首字节: {timings['ttfb']:.3f}s，总耗时: {timings['total']:.3f}s")
 
                 self.root.after(0, lambda: messagebox.showinfo("测试结果", msg))
                 self.root.after(0, self.update_proxy_list)
@@ -317,7 +1755,7 @@ class ProxyPoolGUI:
 
     def test_all_proxies(self):
         """测试所有代理"""
-        if not self.proxy_pool.proxies:
+        if not self.proxy_pool:
             messagebox.showwarning("警告", "代理池为空")
             return
 
@@ -327,11 +1765,27 @@ class ProxyPoolGUI:
         self.test_all_btn.config(state=DISABLED)
         self.root.update()
 
+        # 熔断中的代理等到期后再测试
+        proxies = self.proxy_pool.due_proxies()
+        total = len(proxies)
+        skipped = len(self.proxy_pool) - total
+        done = [0]
+
+        def on_result(proxy):
+            # 在工作线程中调用，复制一份记录交给界面线程刷新对应的行
+            done[0] += 1
+            record, count = dict(proxy), done[0]
+            self.root.after(0, lambda: (self.update_proxy_row(record),
+                                        self.status_var.set(f"正在测试所有代理: {count}/{total}")))
+
         def test_all_thread():
             try:
-                self.proxy_pool.test_all_proxies(test_url)
+                working = self.proxy_pool.test_all_proxies(test_url, on_result, proxies=proxies)
+                msg = f"所有代理测试完成，可用 {working}/{total} 个"
+                if skipped:
+                    msg += f"，另有 {skipped} 个熔断中的代理未测试"
                 self.root.after(0, self.update_proxy_list)
-                self.root.after(0, lambda: messagebox.showinfo("完成", "所有代理测试完成"))
+                self.root.after(0, lambda: messagebox.showinfo("完成", msg))
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("错误", f"测试代理失败: {str(e)}"))
             finally:
@@ -341,34 +1795,102 @@ class ProxyPoolGUI:
         threading.Thread(target=test_all_thread, daemon=True).start()
 
     def get_random_proxy(self):
-        """获取随机代理"""
+        """按选择的策略获取一个代理"""
         protocol = self.protocol_var.get()
-        proxy = self.proxy_pool.get_random_proxy(protocol)
+        strategy = self.strategy_var.get()
+        proxy = self.proxy_pool.select_proxy(protocol, strategy)
 
         if proxy:
             self.root.clipboard_clear()
             self.root.clipboard_append(proxy)
-            messagebox.showinfo("随机代理", f"已选择并复制代理:\n{proxy}")
-            self.status_var.set(f"已复制随机代理: {proxy}")
+            messagebox.showinfo("获取代理", f"已按 {strategy} 策略选择并复制代理:\n{proxy}")
+            self.status_var.set(f"已复制代理: {proxy}")
         else:
             messagebox.showwarning("警告", "没有可用的代理")
 
+    def toggle_forward_server(self):
+        """启动或停止本地转发代理，转发时按当前的协议和选择策略挑选上游代理"""
+        if self.forward_server is not None:
+            server = self.forward_server
+            self.forward_server = None
+            server.stop()
+            self.forward_btn.config(text="启动本地代理")
+            self.forward_port_entry.config(state=NORMAL)
+            self.status_var.set(f"本地代理已停止，共转发 {server.requests} 个请求")
+            return
+
+        try:
+            port = int(self.forward_port_entry.get().strip())
+            server = ForwardProxyServer(self.proxy_pool, port=port, protocol=self.protocol_var.get(),
+                                        strategy=self.strategy_var.get())
+            server.start()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("错误", f"启动本地代理失败: {str(e)}")
+            return
+        self.forward_server = server
+        self.forward_btn.config(text="停止本地代理")
+        self.forward_port_entry.config(state=DISABLED)
+        self.status_var.set(f"本地代理已启动: http://{server.host}:{server.port}")
+
+    def toggle_scheduler(self):
+        """
+        开启或关闭后台健康检查，测试结果定时刷新到列表中。
+
+        后台线程只把结果放进队列，不直接调用 root.after：停止时主线程在等后台线程结束，
+        后台线程若再等主线程处理 Tk 调用就会互相卡住。
+        """
+        if not self.sweep_var.get():
+            self.proxy_pool.stop_scheduler(SWEEP_STOP_TIMEOUT)
+            self.poll_sweep_results()
+            self.status_var.set("后台自动测试已关闭")
+            return
+
+        self.proxy_pool.start_scheduler(self.test_url_entry.get().strip(),
+                                        lambda record: self.sweep_results.put(dict(record)))
+        if self.sweep_poll is None:
+            self.sweep_poll = self.root.after(SWEEP_POLL_MS, self.poll_sweep_results)
+        self.status_var.set(f"后台自动测试已开启，每个可用代理约每 {SWEEP_INTERVAL // 60} 分钟测试一次")
+
+    def poll_sweep_results(self):
+        """在主线程中取出后台测试的结果刷新到列表，同一代理只刷新最新的一条"""
+        if self.sweep_poll is not None:
+            self.root.after_cancel(self.sweep_poll)
+            self.sweep_poll = None
+        records = {}
+        while True:
+            try:
+                record = self.sweep_results.get_nowait()
+            except queue.Empty:
+                break
+            records[record['proxy']] = record
+        for record in records.values():
+            self.update_proxy_row(record)
+        if self.sweep_var.get():
+            self.sweep_poll = self.root.after(SWEEP_POLL_MS, self.poll_sweep_results)
+
+    def on_close(self):
+        """关闭窗口前停止后台任务，保存尚未写入的测试结果"""
+        if self.sweep_poll is not None:
+            self.root.after_cancel(self.sweep_poll)
+            self.sweep_poll = None
+        self.proxy_pool.stop_scheduler(SWEEP_STOP_TIMEOUT)
+        if self.forward_server is not None:
+            self.forward_server.stop()
+        self.root.destroy()
+
     def clear_proxy_pool(self):
         """清空代理池"""
-        if not self.proxy_pool.proxies:
+        if not self.proxy_pool:
             messagebox.showwarning("警告", "代理池已为空")
             return
 
         if messagebox.askyesno("确认", "确定要清空代理池吗？"):
-            self.proxy_pool.proxies = []
-            self.proxy_pool.save_proxies()
+            self.proxy_pool.clear()
             self.update_proxy_list()
             messagebox.showinfo("成功", "代理池已清空")
 
 
 if __name__ == "__main__":
-    import time
-
     root = Tk()
     app = ProxyPoolGUI(root)
     root.mainloop()
\ No newline at end of file
@@ -1,4 +1,6 @@
 import os
+import sys
+import errno
 import shutil
 import zipfile
 import tkinter as tk
@@ -6,8 +8,485 @@ from tkinter import ttk, filedialog, messagebox
 from datetime import datetime
 import time
 import threading
+import tempfile
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import bz2
+import hashlib
 import json
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 每次备份在备份位置旁边保存一份清单(备份名 + MANIFEST_SUFFIX)，记录备份时每个文件的大小、修改时间、
+# 可选的哈希，以及文件内容保存在哪一次备份中，还有全部文件夹(包括空文件夹)；增量备份据此只保存新增和修改的文件
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 2
+# 计算文件哈希时每次读取的字节数
+HASH_CHUNK = 1024 * 1024
+# 去重存储：文件按内容切成数据块，以 SHA-256 命名保存在备份位置的 CHUNK_STORE 文件夹中，相同的数据块只保存一次。
+# 切分点由内容决定，插入或删除数据只影响附近的数据块：每个字节经 CHUNK_GEAR 映射为 0~15，
+# 映射后出现 CHUNK_MARKER 的位置是候选(约 1/256)，候选处之前 CHUNK_WINDOW 字节的 CRC32 低 8 位为 0 时切分；
+# 数据块长度限制在 CHUNK_MIN~CHUNK_MAX 之间，平均约 CHUNK_MIN + 64KB
+CHUNK_STORE = "backup_chunks"
+CHUNK_MIN = 16 * 1024
+CHUNK_MAX = 256 * 1024
+CHUNK_READ = 8 * 1024 * 1024
+CHUNK_GEAR = bytes(hashlib.sha256(bytes([i])).digest()[0] & 15 for i in range(256))
+CHUNK_MARKER = bytes([9, 4])
+CHUNK_WINDOW = 48
+CHUNK_MASK = 0xFF
+# ZIP 备份：可选的压缩算法(lzma 不使用压缩级别)，并行压缩的线程数，最多同时等待写入的文件数，
+# 单个文件的压缩结果在内存中保留的上限(超过后暂存到目标文件夹的临时文件)，所有等待写入的压缩结果
+# 合计占用内存和临时文件的上限，以及每次读取的字节数。直接存储的文件不经过临时文件
+ZIP_METHODS = {
+    'store': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA
+}
+ZIP_WORKERS = os.cpu_count() or 4
+ZIP_PENDING = ZIP_WORKERS * 4
+ZIP_SPOOL = 16 * 1024 * 1024
+ZIP_MEMORY = 128 * 1024 * 1024
+ZIP_SPILL = 1024 * 1024 * 1024
+ZIP_READ = 1024 * 1024
+# 已经压缩过的格式直接存储；不小于 ZIP_PROBE_MIN 的其他文件先试压开头 ZIP_PROBE 字节，
+# 压缩后仍有 ZIP_PROBE_RATIO 以上大小的也直接存储
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.mp3', '.aac', '.ogg', '.flac', '.m4a',
+    '.mp4', '.mkv', '.avi', '.mov', '.webm', '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst'
+}
+ZIP_PROBE = 64 * 1024
+ZIP_PROBE_MIN = 1024 * 1024
+ZIP_PROBE_RATIO = 0.95
+# 文件夹备份：复制线程数，每个任务复制的文件数，每次交给内核复制的字节数，日志报告进度的间隔(秒)
+COPY_WORKERS = 16
+COPY_BATCH = 64
+COPY_CHUNK = 64 * 1024 * 1024
+COPY_LOG_INTERVAL = 1.0
+# Linux 上克隆文件(reflink)的 ioctl，Btrfs、XFS 等文件系统支持，只复制引用不复制数据
+FICLONE = 0x40049409
+# 这些错误表示当前文件系统或内核不支持某种复制方式，遇到后本次备份不再尝试
+COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+
+
+def scan_source(source, exclude_exts):
+    """
+    递归扫描源文件夹，跳过排除的扩展名。
+
+    和 shutil.copytree 一样，指向文件夹的符号链接会进入链接的目标继续扫描，
+    但指向自身上级文件夹的链接(会无限循环)和断开的链接、设备文件等无法备份的条目会被跳过并返回。
+
+    :param source: 源文件夹路径
+    :param exclude_exts: 排除的文件扩展名列表
+    :return: ({相对路径: (大小, 修改时间ns)}, [文件夹相对路径], [排除的相对路径], [(跳过的相对路径, 原因)])，
+             相对路径统一用 / 分隔，文件夹列表包括空文件夹
+    """
+    files = {}
+    folders = []
+    excluded = []
+    skipped = []
+    root = os.stat(source)
+    stack = [(source, "", ((root.st_dev, root.st_ino),))]
+    while stack:
+        folder, prefix, ancestors = stack.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                rel_path = prefix + entry.name
+                if entry.is_dir():
+                    st = entry.stat()
+                    key = (st.st_dev, st.st_ino)
+                    if key in ancestors:
+                        skipped.append((rel_path, "链接指向上级文件夹"))
+                        continue
+                    folders.append(rel_path)
+                    stack.append((entry.path, rel_path + "/", ancestors + (key,)))
+                elif entry.is_file():
+                    if os.path.splitext(entry.name)[1].lower() in exclude_exts:
+                        excluded.append(rel_path)
+                        continue
+                    st = entry.stat()
+                    files[rel_path] = (st.st_size, st.st_mtime_ns)
+                elif entry.is_symlink():
+                    skipped.append((rel_path, "链接的目标不存在"))
+                else:
+                    skipped.append((rel_path, "不是普通文件"))
+    return files, folders, excluded, skipped
+
+
+def file_digest(path):
+    """
+    计算文件内容的 SHA-256。
+
+    :param path: 文件路径
+    :return: 十六进制的哈希值
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(backup_path):
+    """备份(文件夹或 ZIP)对应的清单文件路径"""
+    root, ext = os.path.splitext(backup_path)
+    return (root if ext.lower() == '.zip' else backup_path) + MANIFEST_SUFFIX
+
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    """先写临时文件再替换，中途出错不会留下不完整的清单"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+def list_manifests(dest, prefix=""):
+    """备份位置中以 prefix 开头的所有清单路径，按备份时间从新到旧排列"""
+    if not os.path.isdir(dest):
+        return []
+    names = [name for name in os.listdir(dest) if name.startswith(prefix) and name.endswith(MANIFEST_SUFFIX)]
+    return [os.path.join(dest, name) for name in sorted(names, reverse=True)]
+
+
+def find_parent_manifest(dest, prefix, source, backup=None):
+    """
+    找到同一源文件夹最近一次备份的清单，作为增量备份的基础。
+
+    :param dest: 备份位置
+    :param prefix: 备份名前缀
+    :param source: 源文件夹路径
+    :param backup: 只找保存在这个备份中的清单，如 CHUNK_STORE
+    :return: (清单路径, 清单)，没有可用的清单时返回 (None, None)
+    """
+    source = os.path.normcase(os.path.abspath(source))
+    for path in list_manifests(dest, prefix):
+        try:
+            manifest = load_manifest(path)
+        except (OSError, ValueError):
+            continue
+        if os.path.normcase(os.path.abspath(manifest.get('source', ''))) != source:
+            continue
+        if backup is not None and manifest['backup'] != backup:
+            continue
+        if os.path.exists(os.path.join(dest, manifest['backup'])):
+            return path, manifest
+    return None, None
+
+
+def iter_chunks(f):
+    """
+    按内容把文件切成数据块。
+
+    :param f: 以二进制方式打开的文件
+    :return: 依次产生各数据块(bytes)的生成器
+    """
+    tail = b''
+    while True:
+        block = f.read(CHUNK_READ)
+        data = tail + block if tail else block
+        if not data:
+            return
+        mapped = data.translate(CHUNK_GEAR)
+        pos = 0
+        while len(data) - pos > CHUNK_MIN:
+            limit = min(pos + CHUNK_MAX, len(data))
+            cut = None
+            found = mapped.find(CHUNK_MARKER, pos + CHUNK_MIN - len(CHUNK_MARKER), limit)
+            while found >= 0:
+                end = found + len(CHUNK_MARKER)
+                if not zlib.crc32(data[end - CHUNK_WINDOW:end]) & CHUNK_MASK:
+                    cut = end
+                    break
+                found = mapped.find(CHUNK_MARKER, found + 1, limit)
+            if cut is None:
+                if pos + CHUNK_MAX > len(data):
+                    break
+                cut = pos + CHUNK_MAX
+            yield data[pos:cut]
+            pos = cut
+        tail = data[pos:]
+        if not block:
+            if tail:
+                yield tail
+            return
+
+
+def chunk_path(store, chunk_id):
+    """数据块文件的路径，按哈希的前两位分到子文件夹中"""
+    return os.path.join(store, chunk_id[:2], chunk_id)
+
+
+def write_chunk(store, data, compress):
+    """
+    保存一个数据块，已存在时跳过。
+
+    数据块文件第一个字节表示格式：Z 为 zlib 压缩，R 为原样保存(不压缩或压缩后没有变小)。
+
+    :param store: 数据块文件夹
+    :param data: 数据块内容
+    :param compress: 是否压缩
+    :return: (数据块哈希, 新写入的字节数)
+    """
+    chunk_id = hashlib.sha256(data).hexdigest()
+    path = chunk_path(store, chunk_id)
+    if os.path.exists(path):
+        return chunk_id, 0
+    payload = zlib.compress(data, 1) if compress else data
+    content = b'Z' + payload if len(payload) < len(data) else b'R' + data
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    return chunk_id, len(content)
+
+
+def read_chunk(store, chunk_id):
+    with open(chunk_path(store, chunk_id), 'rb') as f:
+        content = f.read()
+    return zlib.decompress(content[1:]) if content[:1] == b'Z' else content[1:]
+
+
+def collect_chunks(dest):
+    """
+    删除不再被任何清单引用的数据块。
+
+    :param dest: 备份位置
+    :return: (删除的数据块数, 释放的字节数)
+    """
+    store = os.path.join(dest, CHUNK_STORE)
+    if not os.path.isdir(store):
+        return 0, 0
+    referenced = set()
+    for path in list_manifests(dest):
+        for entry in load_manifest(path)['files'].values():
+            if entry[3] == CHUNK_STORE:
+                referenced.update(entry[4])
+
+    removed = freed = 0
+    for folder in os.scandir(store):
+        if not folder.is_dir():
+            continue
+        for entry in os.scandir(folder.path):
+            if entry.name not in referenced:
+                freed += entry.stat().st_size
+                os.remove(entry.path)
+                removed += 1
+    return removed, freed
+
+
+def is_compressed(path, size, head):
+    """
+    判断文件是否已经压缩过、不值得再压缩。
+
+    :param path: 文件路径，用于检查扩展名
+    :param size: 文件大小
+    :param head: 文件开头的数据
+    """
+    if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+        return True
+    if size < ZIP_PROBE_MIN:
+        return False
+    head = head[:ZIP_PROBE]
+    return len(zlib.compress(head, 1)) >= len(head) * ZIP_PROBE_RATIO
+
+
+def new_compressor(compress_type, level):
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(max(1, level))
+    if compress_type == zipfile.ZIP_LZMA:
+        return zipfile.LZMACompressor()
+    return None
+
+
+def compress_file(path, arcname, method, level, spool_dir=None):
+    """
+    在工作线程中读取并压缩一个文件，得到可以直接写入 ZIP 的条目。
+
+    :param path: 文件路径
+    :param arcname: 在 ZIP 中的名称
+    :param method: ZIP_METHODS 中的压缩算法
+    :param level: 压缩级别
+    :param spool_dir: 压缩结果超过 ZIP_SPOOL 时暂存的文件夹，默认为系统临时文件夹
+    :return: (ZipInfo, 压缩后的数据)，数据保存在已回到开头的临时文件中；
+             文件不值得压缩时数据为 None，由调用方用 store_file 直接写入
+    """
+    zinfo = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+    crc = size = 0
+    with open(path, 'rb') as f:
+        data = f.read(ZIP_READ)
+        zinfo.compress_type = ZIP_METHODS[method]
+        if zinfo.compress_type == zipfile.ZIP_STORED or is_compressed(path, zinfo.file_size, data):
+            zinfo.compress_type = zipfile.ZIP_STORED
+            return zinfo, None
+        # LZMA 数据带有结束标记，需要在标志位中注明
+        zinfo.flag_bits = 0x02 if zinfo.compress_type == zipfile.ZIP_LZMA else 0
+
+        spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL, dir=spool_dir)
+        compressor = new_compressor(zinfo.compress_type, level)
+        while data:
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            spool.write(compressor.compress(data))
+            data = f.read(ZIP_READ)
+    spool.write(compressor.flush())
+
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = spool.tell()
+    spool.seek(0)
+    return zinfo, spool
+
+
+def write_zip_entry(zipf, zinfo, data):
+    """
+    把 compress_file 得到的条目追加到 ZIP 中，效果和 ZipFile.write 相同，只是不再压缩。
+
+    :param zipf: 以写入方式打开的 ZipFile
+    :param zinfo: 已填好 CRC 和大小的 ZipInfo
+    :param data: 压缩后的数据
+    """
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader())
+    shutil.copyfileobj(data, zipf.fp, ZIP_READ)
+    zipf.start_dir = zipf.fp.tell()
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def store_file(zipf, path, zinfo):
+    """
+    把文件不压缩地直接写入 ZIP，边读边计算 CRC，不经过临时文件。
+
+    :param zipf: 以写入方式打开的 ZipFile
+    :param path: 文件路径
+    :param zinfo: compress_type 为 ZIP_STORED 的 ZipInfo
+    """
+    with open(path, 'rb') as src, zipf.open(zinfo, 'w') as dest:
+        shutil.copyfileobj(src, dest, ZIP_READ)
+
+
+def new_copy_support():
+    """每次复制开始时可以尝试的内核复制方式，不支持的方式在复制过程中被关闭"""
+    linux = sys.platform.startswith('linux')
+    return {
+        'clone': linux and fcntl is not None,
+        'copy_file_range': linux and hasattr(os, 'copy_file_range'),
+        'sendfile': linux and hasattr(os, 'sendfile')
+    }
+
+
+def fast_copy(src, dst, support):
+    """
+    复制文件内容和元数据，依次尝试 reflink、copy_file_range、sendfile，最后用普通读写补完。
+
+    前几种方式由内核完成复制，数据不经过用户空间；非 Linux 系统使用 shutil.copy2 自带的快速复制。
+
+    :param src: 源文件路径
+    :param dst: 目标文件路径
+    :param support: new_copy_support 返回的字典，多个线程共用
+    """
+    if not any(support.values()):
+        shutil.copy2(src, dst)
+        return
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        st = os.fstat(infd)
+        offset = 0
+        if support['clone'] and st.st_size:
+            try:
+                fcntl.ioctl(outfd, FICLONE, infd)
+                offset = st.st_size
+            except OSError:
+                support['clone'] = False
+        if offset < st.st_size and support['copy_file_range']:
+            try:
+                while True:
+                    copied = os.copy_file_range(infd, outfd, COPY_CHUNK, offset, offset)
+                    if not copied:
+                        break
+                    offset += copied
+            except OSError as e:
+                if e.errno not in COPY_UNSUPPORTED:
+                    raise
+                support['copy_file_range'] = False
+        if offset < st.st_size and support['sendfile']:
+            os.lseek(outfd, offset, os.SEEK_SET)
+            try:
+                while True:
+                    copied = os.sendfile(outfd, infd, offset, COPY_CHUNK)
+                    if not copied:
+                        break
+                    offset += copied
+            except OSError as e:
+                if e.errno not in COPY_UNSUPPORTED:
+                    raise
+                support['sendfile'] = False
+        if offset < st.st_size:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst, ZIP_READ)
+    # 和 shutil.copy2 一样复制权限、时间、扩展属性和文件标志
+    shutil.copystat(src, dst)
+
+
+def restore_manifest(path, restore_path, log=None):
+    """
+    按清单把某一次备份时的全部文件恢复到 restore_path，内容从清单记录的各次备份中取出。
+
+    :param path: 清单路径
+    :param restore_path: 恢复位置
+    :param log: 可选的日志函数
+    :return: 恢复的文件数
+    """
+    manifest = load_manifest(path)
+    dest = os.path.dirname(path)
+    support = new_copy_support()
+    for folder in manifest.get('dirs', []):
+        os.makedirs(os.path.join(restore_path, *folder.split('/')), exist_ok=True)
+    groups = {}
+    for rel_path, entry in manifest['files'].items():
+        groups.setdefault(entry[3], []).append((rel_path, entry))
+
+    for stored_in, entries in groups.items():
+        container = os.path.join(dest, stored_in)
+        if not os.path.exists(container):
+            raise FileNotFoundError(f"缺少备份 {stored_in}，无法恢复其中的 {len(entries)} 个文件")
+        if log:
+            log(f"从 {stored_in} 恢复 {len(entries)} 个文件")
+        zipf = zipfile.ZipFile(container, 'r') if stored_in.lower().endswith('.zip') else None
+        try:
+            for rel_path, entry in entries:
+                mtime = entry[1]
+                target = os.path.join(restore_path, *rel_path.split('/'))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if stored_in == CHUNK_STORE:
+                    with open(target, 'wb') as dst:
+                        for chunk_id in entry[4]:
+                            dst.write(read_chunk(container, chunk_id))
+                elif zipf is not None:
+                    with zipf.open(rel_path) as src, open(target, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                else:
+                    fast_copy(os.path.join(container, *rel_path.split('/')), target, support)
+                os.utime(target, ns=(mtime, mtime))
+        finally:
+            if zipf is not None:
+                zipf.close()
+    return len(manifest['files'])
 
 
 # 定义备份应用程序类
@@ -105,12 +584,33 @@ class BackupApp:
         self.compress_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(options_frame, text="压缩备份 (ZIP格式)", variable=self.compress_var).grid(row=0, column=0,
                                                                                                    sticky=tk.W)
+        self.dedup_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="去重存储 (相同内容在所有备份中只保存一次)",
+                        variable=self.dedup_var).grid(row=0, column=1, sticky=tk.W)
 
         # 排除选项
         ttk.Label(options_frame, text="排除文件扩展名 (逗号分隔):").grid(row=1, column=0, sticky=tk.W)
         self.exclude_var = tk.StringVar(value=".tmp, .log, .cache")
         ttk.Entry(options_frame, textvariable=self.exclude_var, width=50).grid(row=1, column=1)
 
+        # ZIP 压缩算法和级别
+        ttk.Label(options_frame, text="ZIP 压缩算法和级别:").grid(row=3, column=0, sticky=tk.W)
+        zip_frame = ttk.Frame(options_frame)
+        zip_frame.grid(row=3, column=1, sticky=tk.W)
+        self.zip_method_var = tk.StringVar(value="deflate")
+        ttk.Combobox(zip_frame, textvariable=self.zip_method_var, values=list(ZIP_METHODS), state="readonly",
+                     width=10).pack(side=tk.LEFT)
+        self.zip_level_var = tk.StringVar(value="6")
+        ttk.Spinbox(zip_frame, from_=0, to=9, textvariable=self.zip_level_var, width=3).pack(side=tk.LEFT, padx=5)
+
+        # 增量选项
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="增量备份 (只保存新增和修改的文件)",
+                        variable=self.incremental_var).grid(row=2, column=0, sticky=tk.W)
+        self.hash_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="比较文件哈希 (修改时间变了但内容没变的文件不再保存)",
+                        variable=self.hash_var).grid(row=2, column=1, sticky=tk.W)
+
         # 计划选项
         schedule_frame = ttk.LabelFrame(self.backup_tab, text="备份计划", padding=10)
         schedule_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -301,6 +801,14 @@ class BackupApp:
         compress = self.compress_var.get()
         schedule = self.schedule_var.get()
         exclude_exts = [ext.strip() for ext in self.exclude_var.get().split(",")]
+        incremental = self.incremental_var.get()
+        use_hash = self.hash_var.get()
+        dedup = self.dedup_var.get()
+        method = self.zip_method_var.get()
+        try:
+            level = min(9, max(0, int(self.zip_level_var.get())))
+        except ValueError:
+            level = 6
 
         if schedule == "now":
             self.log_text.insert(tk.END, f"开始备份: {source} 到 {dest}\n")
@@ -309,7 +817,7 @@ class BackupApp:
             self.backup_running = True
             self.current_backup_thread = threading.Thread(
                 target=self.run_backup,
-                args=(source, dest, compress, exclude_exts),
+                args=(source, dest, compress, exclude_exts, incremental, use_hash, dedup, method, level),
                 daemon=True
             )
             self.current_backup_thread.start()
@@ -325,19 +833,26 @@ class BackupApp:
             self.log_text.see(tk.END)
 
     # 执行备份操作
-    def run_backup(self, source, dest, compress, exclude_exts):
+    def run_backup(self, source, dest, compress, exclude_exts, incremental=False, use_hash=False, dedup=False,
+                   method='deflate', level=6):
         """
         执行备份操作。
 
         :param source: 源文件夹路径
         :param dest: 备份目标位置
-        :param compress: 是否压缩备份
+        :param compress: 是否压缩备份(去重存储时表示是否压缩数据块)
         :param exclude_exts: 排除的文件扩展名列表
+        :param incremental: 是否只备份上次备份之后新增和修改的文件
+        :param use_hash: 是否用文件哈希判断内容是否真的变化
+        :param dedup: 是否保存到去重的数据块存储中
+        :param method: ZIP 压缩算法，见 ZIP_METHODS
+        :param level: ZIP 压缩级别
         """
         try:
             start_time = time.time()
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_name = f"backup_{os.path.basename(source)}_{timestamp}"
+            prefix = f"backup_{os.path.basename(source)}_"
+            backup_name = prefix + timestamp
             backup_path = os.path.join(dest, backup_name)
 
             self.add_log(f"备份开始: {backup_name}")
@@ -345,16 +860,69 @@ class BackupApp:
             if not os.path.exists(dest):
                 os.makedirs(dest)
 
-            if compress:
+            scanned, folders, excluded, skipped = scan_source(source, exclude_exts)
+            for rel_path in excluded:
+                self.add_log(f"排除: {rel_path}")
+            for rel_path, reason in skipped:
+                self.add_log(f"跳过: {rel_path} ({reason})")
+
+            if incremental:
+                parent_path, parent = find_parent_manifest(dest, prefix, source, CHUNK_STORE if dedup else None)
+            else:
+                parent_path, parent = None, None
+            if incremental and parent is None:
+                self.add_log("没有找到之前的备份，执行完整备份")
+            elif parent is not None:
+                self.add_log(f"基于 {parent['backup']} 执行增量备份")
+
+            if dedup:
+                container = CHUNK_STORE
+            else:
+                container = backup_name + (".zip" if compress else "")
+            files, changed, deleted = self.plan_backup(source, dest, scanned, parent, use_hash, container)
+            if not self.backup_running:
+                self.add_log("备份已取消")
+                return
+            self.add_log(f"需要保存 {len(changed)} 个文件，未变化 {len(files) - len(changed)} 个，"
+                         f"已删除 {len(deleted)} 个")
+
+            if dedup:
+                self.add_log("保存到去重存储...")
+                written = self.store_chunks(source, os.path.join(dest, CHUNK_STORE), changed, files, compress)
+            elif compress:
                 backup_path += ".zip"
-                self.add_log("创建ZIP压缩备份...")
-                self.create_zip_backup(source, backup_path, exclude_exts)
+                self.add_log(f"创建ZIP压缩备份 ({method}, {ZIP_WORKERS} 个线程)...")
+                self.create_zip_backup(source, backup_path, changed, method, level,
+                                       {rel_path: files[rel_path][0] for rel_path in changed})
             else:
                 os.makedirs(backup_path)
                 self.add_log("创建文件夹备份...")
-                self.copy_folder(source, backup_path, exclude_exts)
+                # 增量备份只需创建上次之后新增的文件夹，恢复时按清单重建全部文件夹
+                old_folders = set(parent.get('dirs', [])) if parent else set()
+                self.copy_folder(source, backup_path, changed,
+                                 [folder for folder in folders if folder not in old_folders])
+            if not self.backup_running:
+                return
 
-            backup_size = self.get_folder_size(backup_path) if not compress else os.path.getsize(backup_path)
+            manifest_file = manifest_path(backup_path)
+            save_manifest(manifest_file, {
+                'version': MANIFEST_VERSION,
+                'source': source,
+                'backup': container,
+                'parent': parent['backup'] if parent else None,
+                'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'hash': use_hash,
+                'files': files,
+                'dirs': folders,
+                'deleted': deleted
+            })
+
+            if dedup:
+                backup_size = written
+            elif not compress:
+                backup_size = sum(files[rel_path][0] for rel_path in changed)
+            else:
+                backup_size = os.path.getsize(backup_path)
             size_str = self.format_size(backup_size)
 
             elapsed = time.time() - start_time
@@ -364,12 +932,18 @@ class BackupApp:
                 'id': len(self.backup_history) + 1,
                 'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 'source': source,
-                'destination': backup_path,
+                'destination': manifest_file if dedup else backup_path,
                 'status': "成功",
                 'size': size_str,
                 'elapsed': f"{elapsed:.2f}秒",
-                'compress': "是" if compress else "否",
-                'exclude': ", ".join(exclude_exts)
+                'compress': (f"是 ({method} {level})" if not dedup else "是") if compress else "否",
+                'exclude': ", ".join(exclude_exts),
+                'mode': ("去重" if dedup else "") + ("增量" if parent else "完整"),
+                'dedup': dedup,
+                'parent': parent['backup'] if parent else "",
+                'manifest': manifest_file,
+                'changed': len(changed),
+                'deleted': len(deleted)
             }
 
             self.backup_history.append(backup_record)
@@ -381,65 +955,214 @@ class BackupApp:
         finally:
             self.backup_running = False
 
-    # 创建ZIP压缩备份
-    def create_zip_backup(self, source, zip_path, exclude_exts):
+    # 对比上次的清单
+    def plan_backup(self, source, dest, scanned, parent, use_hash, container):
         """
-        创建ZIP压缩备份。
+        对比扫描结果和上次备份的清单，决定本次要保存哪些文件。
+
+        大小和修改时间都没变的文件沿用上次的记录；启用哈希时，变化的文件再比较内容哈希，
+        内容相同的只更新大小和修改时间。上次清单引用的备份已不存在时，相应的文件重新保存。
 
         :param source: 源文件夹路径
-        :param zip_path: ZIP文件路径
-        :param exclude_exts: 排除的文件扩展名列表
+        :param dest: 备份目标位置
+        :param scanned: scan_source 的扫描结果
+        :param parent: 上次备份的清单，完整备份时为 None
+        :param use_hash: 是否计算文件哈希
+        :param container: 本次备份的名称(文件夹名或 ZIP 文件名，去重存储时为 CHUNK_STORE)
+        :return: (本次的清单文件表, 需要保存的相对路径列表, 已删除的相对路径列表)
         """
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(source):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, source)
+        old_files = parent['files'] if parent else {}
+        available = {name for name in {entry[3] for entry in old_files.values()}
+                     if os.path.exists(os.path.join(dest, name))}
+        if container == CHUNK_STORE:
+            available &= {CHUNK_STORE}
+
+        files = {}
+        changed = []
+        for rel_path, (size, mtime) in scanned.items():
+            old = old_files.get(rel_path)
+            if old is not None and old[3] not in available:
+                old = None
+            unchanged = old is not None and old[0] == size and old[1] == mtime
+            if unchanged and (old[2] or not use_hash):
+                files[rel_path] = old
+                continue
+
+            digest = None
+            if use_hash:
+                if not self.backup_running:
+                    break
+                digest = file_digest(os.path.join(source, *rel_path.split('/')))
+                if old is not None and (unchanged or old[2] == digest):
+                    files[rel_path] = [size, mtime, digest] + old[3:]
+                    continue
+            files[rel_path] = [size, mtime, digest, container]
+            changed.append(rel_path)
 
-                    _, ext = os.path.splitext(file)
-                    if ext.lower() in exclude_exts:
-                        self.add_log(f"排除: {rel_path}")
-                        continue
+        deleted = [rel_path for rel_path in old_files if rel_path not in scanned]
+        return files, changed, deleted
 
-                    zipf.write(file_path, rel_path)
-                    self.add_log(f"添加: {rel_path}")
+    # 保存到去重存储
+    def store_chunks(self, source, store, files, entries, compress):
+        """
+        把文件按内容切成数据块保存到去重存储，已有的数据块不再写入。
 
+        :param source: 源文件夹路径
+        :param store: 数据块文件夹
+        :param files: 要保存的相对路径列表
+        :param entries: 清单文件表，保存后在对应记录中补上文件哈希和数据块列表
+        :param compress: 是否压缩数据块
+        :return: 新写入的字节数
+        """
+        written = 0
+        reused = 0
+        for rel_path in files:
+            digest = hashlib.sha256()
+            chunk_ids = []
+            with open(os.path.join(source, *rel_path.split('/')), 'rb') as f:
+                for data in iter_chunks(f):
+                    digest.update(data)
+                    chunk_id, size = write_chunk(store, data, compress)
+                    chunk_ids.append(chunk_id)
+                    written += size
+                    reused += not size
                     if not self.backup_running:
-                        self.add_log("备份已取消")
-                        if os.path.exists(zip_path):
-                            os.remove(zip_path)
-                        return
+                        break
+            if not self.backup_running:
+                self.add_log("备份已取消")
+                return written
+            entries[rel_path][2] = digest.hexdigest()
+            entries[rel_path][4:] = [chunk_ids]
+            self.add_log(f"保存: {rel_path} ({len(chunk_ids)} 个数据块)")
 
-    # 复制文件夹
-    def copy_folder(self, source, dest, exclude_exts):
+        self.add_log(f"新写入 {self.format_size(written)}，{reused} 个数据块已存在")
+        return written
+
+    # 创建ZIP压缩备份
+    def create_zip_backup(self, source, zip_path, files, method='deflate', level=6, sizes=None):
         """
-        复制文件夹。
+        创建ZIP压缩备份。
+
+        多个线程同时读取和压缩文件，当前线程按文件顺序把压缩好的条目依次写入 ZIP；
+        直接存储的文件(已压缩的格式或 store 算法)由当前线程边读边写，不经过临时文件。
+        每个等待写入的压缩结果按 min(文件大小, ZIP_SPOOL) 计入内存、超出部分计入目标文件夹中的临时文件，
+        分别超过 ZIP_MEMORY、ZIP_SPILL 或文件数达到 ZIP_PENDING 时先写入最早的条目，
+        占用与文件数和 CPU 核数无关。
 
         :param source: 源文件夹路径
-        :param dest: 目标文件夹路径
-        :param exclude_exts: 排除的文件扩展名列表
+        :param zip_path: ZIP文件路径
+        :param files: 要保存的相对路径列表
+        :param method: 压缩算法，见 ZIP_METHODS
+        :param level: 压缩级别
+        :param sizes: 可选的 {相对路径: 文件大小}，没有时逐个读取文件大小
         """
-        for item in os.listdir(source):
-            s = os.path.join(source, item)
-            d = os.path.join(dest, item)
-
-            if os.path.isdir(s):
-                shutil.copytree(s, d)
-                self.add_log(f"复制文件夹: {item}")
-            else:
-                _, ext = os.path.splitext(item)
-                if ext.lower() in exclude_exts:
-                    self.add_log(f"排除: {item}")
+        pending = deque()  # [(源文件路径, 内存占用, 临时文件占用, Future 或直接存储的 ZipInfo)]
+        in_memory = spilled = 0
+        written = 0
+        last_log = time.time()
+        spool_dir = os.path.dirname(os.path.abspath(zip_path))
+        with zipfile.ZipFile(zip_path, 'w') as zipf, ThreadPoolExecutor(ZIP_WORKERS) as executor:
+            def write_next():
+                nonlocal in_memory, spilled, written, last_log
+                path, memory, spill, entry = pending.popleft()
+                zinfo, data = entry.result() if isinstance(entry, Future) else (entry, None)
+                if data is None:
+                    store_file(zipf, path, zinfo)
+                else:
+                    with data:
+                        write_zip_entry(zipf, zinfo, data)
+                in_memory -= memory
+                spilled -= spill
+                written += 1
+                if time.time() - last_log >= COPY_LOG_INTERVAL:
+                    last_log = time.time()
+                    self.add_log(f"已压缩 {written}/{len(files)} 个文件")
+
+            for rel_path in files:
+                if not self.backup_running:
+                    break
+                path = os.path.join(source, *rel_path.split('/'))
+                if method == 'store' or os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+                    zinfo = zipfile.ZipInfo.from_file(path, rel_path, strict_timestamps=False)
+                    zinfo.compress_type = zipfile.ZIP_STORED
+                    while pending and len(pending) >= ZIP_PENDING:
+                        write_next()
+                    pending.append((path, 0, 0, zinfo))
                     continue
-
-                shutil.copy2(s, d)
-                self.add_log(f"复制文件: {item}")
+                size = sizes[rel_path] if sizes is not None else os.path.getsize(path)
+                memory, spill = min(size, ZIP_SPOOL), max(size - ZIP_SPOOL, 0)
+                while pending and (in_memory + memory > ZIP_MEMORY or spilled + spill > ZIP_SPILL
+                                   or len(pending) >= ZIP_PENDING):
+                    write_next()
+                pending.append((path, memory, spill,
+                                executor.submit(compress_file, path, rel_path, method, level, spool_dir)))
+                in_memory += memory
+                spilled += spill
+            while pending and self.backup_running:
+                write_next()
 
             if not self.backup_running:
-                self.add_log("备份已取消")
-                if os.path.exists(dest):
-                    shutil.rmtree(dest)
-                return
+                executor.shutdown(cancel_futures=True)
+                for path, memory, spill, entry in pending:
+                    if isinstance(entry, Future) and not entry.cancelled() and entry.exception() is None:
+                        data = entry.result()[1]
+                        if data is not None:
+                            data.close()
+
+        if not self.backup_running:
+            self.add_log("备份已取消")
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            return
+        self.add_log(f"压缩了 {written} 个文件")
+
+    # 复制文件夹
+    def copy_folder(self, source, dest, files, folders=()):
+        """
+        复制文件夹。
+
+        先一次创建所有目标文件夹(包括空文件夹)，再由多个线程分批复制文件，每批 COPY_BATCH 个，
+        复制方式见 fast_copy；日志只定时报告进度，文件很多时不会被逐条日志拖慢。
+
+        :param source: 源文件夹路径
+        :param dest: 目标文件夹路径
+        :param files: 要复制的相对路径列表
+        :param folders: 要创建的文件夹相对路径列表，文件所在的文件夹不在其中时也会创建
+        """
+        for folder in sorted(set(folders) | {rel_path.rpartition('/')[0] for rel_path in files}):
+            os.makedirs(os.path.join(dest, *folder.split('/')), exist_ok=True)
+
+        support = new_copy_support()
+
+        def copy_batch(batch):
+            for rel_path in batch:
+                if not self.backup_running:
+                    return 0
+                parts = rel_path.split('/')
+                fast_copy(os.path.join(source, *parts), os.path.join(dest, *parts), support)
+            return len(batch)
+
+        copied = 0
+        last_log = time.time()
+        with ThreadPoolExecutor(COPY_WORKERS) as executor:
+            futures = [executor.submit(copy_batch, files[i:i + COPY_BATCH]) for i in range(0, len(files), COPY_BATCH)]
+            try:
+                for future in futures:
+                    copied += future.result()
+                    if not self.backup_running:
+                        break
+                    if time.time() - last_log >= COPY_LOG_INTERVAL:
+                        last_log = time.time()
+                        self.add_log(f"已复制 {copied}/{len(files)} 个文件")
+            finally:
+                executor.shutdown(cancel_futures=True)
+
+        if not self.backup_running:
+            self.add_log("备份已取消")
+            if os.path.exists(dest):
+                shutil.rmtree(dest)
+            return
+        self.add_log(f"复制了 {copied} 个文件")
 
     # 获取文件夹大小
     def get_folder_size(self, path):
@@ -553,7 +1276,13 @@ class BackupApp:
 用时: {record['elapsed']}
 压缩: {record['compress']}
 排除的文件: {record['exclude']}
+备份方式: {record.get('mode', "完整")}
 """
+        if record.get('parent'):
+            info += f"基于备份: {record['parent']}\n"
+        if record.get('manifest'):
+            info += f"保存文件数: {record.get('changed', 0)}\n已删除文件数: {record.get('deleted', 0)}\n"
+
         text.insert(tk.END, info)
         text.config(state=tk.DISABLED)
 
@@ -595,7 +1324,10 @@ class BackupApp:
         try:
             self.add_log(f"开始恢复备份 {record_id} 到 {restore_path}")
 
-            if record['destination'].endswith('.zip'):
+            if record.get('manifest') and os.path.exists(record['manifest']):
+                count = restore_manifest(record['manifest'], restore_path, self.add_log)
+                self.add_log(f"按清单恢复了 {count} 个文件")
+            elif record['destination'].endswith('.zip'):
                 with zipfile.ZipFile(record['destination'], 'r') as zipf:
                     zipf.extractall(restore_path)
             else:
@@ -627,9 +1359,27 @@ class BackupApp:
 
         for i, record in enumerate(self.backup_history):
             if record['id'] == record_id:
-                if record['destination'].endswith('.zip') and os.path.exists(record['destination']):
+                if record.get('dedup'):
+                    if self.backup_running:
+                        messagebox.showwarning("警告", "备份进行中，请稍后再删除去重存储中的备份")
+                        return
+                    try:
+                        if os.path.exists(record['manifest']):
+                            os.remove(record['manifest'])
+                        removed, freed = collect_chunks(os.path.dirname(record['manifest']))
+                        self.add_log(f"清理了 {removed} 个不再使用的数据块，释放 {self.format_size(freed)}")
+                    except Exception as e:
+                        messagebox.showwarning("警告", f"无法删除备份文件: {str(e)}")
+                elif record['destination'].endswith('.zip') and os.path.exists(record['destination']):
+                    dependents = self.find_dependents(record['destination'])
+                    if dependents and not messagebox.askyesno(
+                            "确认", f"之后的 {len(dependents)} 次增量备份引用了这个备份中的文件，"
+                                    f"删除后它们将无法完整恢复。仍要删除吗？"):
+                        return
                     try:
                         os.remove(record['destination'])
+                        if record.get('manifest') and os.path.exists(record['manifest']):
+                            os.remove(record['manifest'])
                     except Exception as e:
                         messagebox.showwarning("警告", f"无法删除备份文件: {str(e)}")
 
@@ -640,6 +1390,28 @@ class BackupApp:
         self.save_backup_history()
         messagebox.showinfo("成功", "备份记录已删除")
 
+    # 查找依赖某个备份的增量备份
+    def find_dependents(self, backup_path):
+        """
+        查找清单中引用了指定备份里文件的其他备份。
+
+        :param backup_path: 备份路径
+        :return: 这些备份的清单路径列表
+        """
+        dest, name = os.path.split(backup_path)
+        own = manifest_path(backup_path)
+        dependents = []
+        for path in list_manifests(dest):
+            if path == own:
+                continue
+            try:
+                files = load_manifest(path)['files']
+            except (OSError, ValueError, KeyError):
+                continue
+            if any(entry[3] == name for entry in files.values()):
+                dependents.append(path)
+        return dependents
+
     # 清除历史记录
     def clear_history(self):
         """
@@ -0,0 +1,1340 @@
+"""
+日志分析核心：流式分析引擎、关键词匹配、日志格式解析、模板聚类与行索引。
+
+这个模块不依赖 tkinter，可以被图形界面(7-LogAnalyzer.py)复用，也可以直接在命令行批量分析:
+
+    python log_analyzer_core.py "/var/log/*.log" --format json
+"""
+from collections import defaultdict, OrderedDict
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import bz2
+import csv
+import glob
+import gzip
+import json
+import lzma
+import math
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+# 每次读取的块大小，内存占用只与它有关，与日志文件大小无关
+CHUNK_SIZE = 1024 * 1024
+# 每分析这么多字节回报一次进度，界面据此刷新统计
+PROGRESS_BYTES = 8 * 1024 * 1024
+# 并行分析时每个任务处理的最大字节数，以及值得启用多进程的最小文件大小
+RANGE_BYTES = 64 * 1024 * 1024
+PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+# 错误详情每页显示的行数
+DETAIL_PAGE_SIZE = 200
+# 命令行模式默认的错误关键词
+DEFAULT_KEYWORDS = ("error", "exception", "fail", "critical", "warning")
+# 行索引每隔多少行记录一次行首偏移，以及显示行时每次读取的字节数
+INDEX_STEP = 1024
+DETAIL_READ = 64 * 1024
+# gzip 文件按偏移读取行时使用的检查点间隔(解压后的字节数)，以及建立检查点时每次送入解压的原始字节数
+GZIP_CHECKPOINT = 16 * 1024 * 1024
+GZIP_READ = 64 * 1024
+# 错误消息模板的数量上限、归入同一模板的最低相似度，以及界面中每种错误显示的模板数
+MAX_TEMPLATES = 2000
+TEMPLATE_SIMILARITY = 0.5
+TEMPLATES_PER_TYPE = 50
+# 提取模板前屏蔽的可变部分：UUID、IP、十六进制数、数字与时间
+TEMPLATE_MASK = re.compile(
+    r"(?=[-+0-9a-fA-F])(?:"  # 先用首字符过滤，减少逐个尝试分支的次数
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?"
+    r"|0x[0-9a-fA-F]+"
+    r"|[-+]?\d+(?:[.:]\d+)*)")
+
+# 压缩格式的文件头与对应的解压方式，分析时边读边解压，不落盘
+COMPRESSED_FORMATS = (
+    ("gzip", b"\x1f\x8b", lambda raw: gzip.GzipFile(fileobj=raw, mode="rb")),
+    ("bz2", b"BZh", lambda raw: bz2.BZ2File(raw)),
+    ("xz", b"\xfd7zXZ\x00", lambda raw: lzma.LZMAFile(raw)),
+)
+# 轮转日志的文件名: system.log, system.log.0, system.log.1.gz ...
+ROTATION_NAME = re.compile(r"^(?P<base>.+?)(?:\.(?P<num>\d+))?(?:\.(?:gz|bz2|xz))?$")
+
+
+def open_log(path):
+    """按文件头识别 gzip/bz2/xz 压缩，返回 (解压后的流, 原始文件)，原始文件的读取位置用于计算进度"""
+    raw = open(path, "rb")
+    head = raw.read(6)
+    raw.seek(0)
+    for _, magic, opener in COMPRESSED_FORMATS:
+        if head.startswith(magic):
+            return opener(raw), raw
+    return raw, raw
+
+
+class GzipIndex:
+    """
+    gzip 文件的随机读取索引：每解压 GZIP_CHECKPOINT 字节保存一份 zlib 解压状态，
+    按偏移读取时从之前最近的检查点继续解压，不必每次从文件开头解压。
+
+    分析文件时顺带建立；没有建完的(并行分析或被取消)在读取时按需往后补。
+    """
+
+    def __init__(self):
+        self.points = [(0, 0, zlib.decompressobj(31))]  # [(解压后的偏移, 原始文件的偏移, 解压状态)]
+        self.offsets = [0]  # 各检查点解压后的偏移，用于二分查找
+        self.complete = False
+        self.building = False
+        self._lock = threading.Lock()
+
+    def build(self, raw):
+        """从头解压整个文件，逐块产出解压后的数据并沿途保存检查点"""
+        self.building = True
+        try:
+            for _, data in self._inflate(raw, self.points[0], record=True):
+                yield data
+        finally:
+            self.building = False
+
+    def readlines(self, raw, positions):
+        """
+        读取解压后各偏移处开始的一行(含换行符)，按 positions 的顺序返回。
+
+        按偏移从小到大一次解压过去，相邻的行接着解压；中间有更近的检查点时跳到检查点。
+        """
+        result = [b""] * len(positions)
+        with self._lock:
+            inflate = None
+            buf, buf_start = b"", 0  # 当前解压出的块及其解压后的偏移
+            for k in sorted(range(len(positions)), key=positions.__getitem__):
+                at = positions[k]
+                i = bisect_right(self.offsets, at) - 1
+                if inflate is None or at < buf_start or self.offsets[i] > buf_start + len(buf):
+                    if inflate is not None:
+                        inflate.close()
+                    # 只有从最后一个检查点出发、且没有在分析中同时建立时，才能顺带补上新的检查点
+                    record = i == len(self.offsets) - 1 and not self.complete and not self.building
+                    inflate = self._inflate(raw, self.points[i], record)
+                    buf, buf_start = b"", self.offsets[i]
+                parts = []
+                while True:
+                    while buf is not None and buf_start + len(buf) <= at:
+                        buf_start, buf = next(inflate, (buf_start + len(buf), None))
+                    if buf is None:  # 已到文件末尾
+                        inflate, buf = None, b""
+                        break
+                    cut = buf.find(b"\n", at - buf_start)
+                    if cut >= 0:
+                        parts.append(buf[at - buf_start:cut + 1])
+                        break
+                    parts.append(buf[at - buf_start:])
+                    at = buf_start + len(buf)
+                result[k] = b"".join(parts)
+            if inflate is not None:
+                inflate.close()
+        return result
+
+    def _inflate(self, raw, point, record=False):
+        """从检查点开始解压，逐块产出 (解压后的偏移, 数据)；record 时在最后一个检查点之后保存新的检查点"""
+        out, pos, state = point
+        decompressor = state.copy()
+        raw.seek(pos)
+        while True:
+            if record and out >= self.offsets[-1] + GZIP_CHECKPOINT:
+                self.points.append((out, pos, decompressor.copy()))
+                self.offsets.append(out)
+            data = raw.read(GZIP_READ)
+            if not data:
+                if not decompressor.eof:
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+                break
+            pos += len(data)
+            chunk = decompressor.decompress(data)
+            finished = False
+            while decompressor.eof and decompressor.unused_data:
+                # 多个 gzip 成员首尾相连；之后不是 gzip 数据(如补齐的零字节)时到此结束
+                rest = decompressor.unused_data
+                if not rest.startswith(b"\x1f\x8b"):
+                    finished = True
+                    break
+                decompressor = zlib.decompressobj(31)
+                chunk += decompressor.decompress(rest)
+            if chunk:
+                yield out, chunk
+                out += len(chunk)
+            if finished:
+                break
+        if record:
+            self.complete = True
+
+
+class HitLineStore:
+    """
+    保存 bz2/xz 文件中命中行的原文：这两种格式无法保存解压状态，按偏移读取只能从头解压，
+    因此分析时把命中行写入临时文件，按日志流中的偏移(递增)查找。只占用每行 16 字节的内存。
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.offsets = array('Q')  # 命中行在日志流中的偏移
+        self.positions = array('Q')  # 命中行在临时文件中的位置，最后多一项为文件末尾
+        self.positions.append(0)
+        self._lock = threading.Lock()
+
+    def add(self, offset, line):
+        with self._lock:
+            self.file.seek(self.positions[-1])
+            self.file.write(line)
+            self.offsets.append(offset)
+            self.positions.append(self.positions[-1] + len(line))
+
+    def get(self, offset):
+        """偏移 offset 处的命中行，没有保存时返回 None"""
+        with self._lock:
+            i = bisect_left(self.offsets, offset)
+            if i == len(self.offsets) or self.offsets[i] != offset:
+                return None
+            self.file.seek(self.positions[i])
+            return self.file.read(self.positions[i + 1] - self.positions[i])
+
+    def close(self):
+        self.file.close()
+
+
+def compression_of(path):
+    """按文件头返回压缩格式的名称(gzip/bz2/xz)，未压缩时返回 None"""
+    with open(path, "rb") as f:
+        head = f.read(6)
+    for name, magic, _ in COMPRESSED_FORMATS:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def is_compressed(path):
+    return compression_of(path) is not None
+
+
+def find_rotation_series(path):
+    """找出与 path 属于同一轮转序列的文件，按从旧到新排列，如 system.log.2.gz ... system.log.0.gz, system.log"""
+    directory, name = os.path.split(os.path.abspath(path))
+    base = ROTATION_NAME.match(name).group("base")
+    series = []
+    for entry in os.listdir(directory):
+        m = ROTATION_NAME.match(entry)
+        if m and m.group("base") == base and os.path.isfile(os.path.join(directory, entry)):
+            series.append((int(m.group("num")) if m.group("num") else -1, entry))
+    series.sort(key=lambda x: x[0], reverse=True)
+    return [os.path.join(directory, entry) for _, entry in series]
+
+
+# 关键词匹配算法: trie 为按前缀合并的单个正则，只需扫描一遍；naive 为逐个关键词查找的旧实现。
+# 两者结果相同：一行包含多个关键词时都归入列表中最靠前的关键词
+MATCHER_MODES = ("trie", "naive")
+
+
+def build_trie_pattern(keywords):
+    """把关键词按公共前缀合并成一个正则，避免对每个关键词分别扫描"""
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        alternatives = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if "" in node:
+            # 较短的关键词是较长关键词的前缀时，贪婪匹配会优先取较长的
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """按关键词集合构建一次的匹配器，返回命中关键词的序号"""
+
+    def __init__(self, keywords, mode="trie"):
+        if mode not in MATCHER_MODES:
+            raise ValueError(f"未知的匹配算法: {mode}")
+        self.mode = mode
+        self.keywords = []
+        for kw in keywords:
+            kw = kw.lower()
+            if kw and kw not in self.keywords:
+                self.keywords.append(kw)
+        # 同一位置正则只返回最长的关键词，作为它前缀的较短关键词也在这里命中，取其中序号最小的；
+        # 同时以 UTF-8 字节为键，供字节上的查找使用
+        self._index = {}
+        for i, kw in enumerate(self.keywords):
+            best = min(j for j, other in enumerate(self.keywords) if kw.startswith(other))
+            self._index[kw] = self._index[kw.encode("utf-8")] = best
+        self.pattern = None
+        self.bytes_pattern = None
+        if mode == "trie" and self.keywords:
+            source = build_trie_pattern(self.keywords)
+            self.pattern = re.compile(source)
+            self.bytes_pattern = re.compile(source.encode("utf-8"))
+
+    def match(self, line_lower):
+        """返回行中包含的关键词里序号最小的一个，无匹配返回 -1"""
+        if self.pattern is not None:
+            m = self.pattern.search(line_lower)
+            return -1 if m is None else self.resolve(self.pattern.search, line_lower, m, len(line_lower))
+        if self.mode == "naive":
+            for i, kw in enumerate(self.keywords):
+                if kw in line_lower:
+                    return i
+        return -1
+
+    def resolve(self, search, text, m, end):
+        """
+        m 是 text 中某一行的第一个匹配，继续查找到行尾 end 为止的其余匹配(包括重叠的)，
+        返回其中序号最小的关键词序号；已是第一个关键词时不再查找。
+
+        :param search: 在 text 上查找用的 pattern.search(文本或字节)
+        """
+        index = self._index
+        best = index[m.group()]
+        while best > 0:
+            m = search(text, m.start() + 1, end)
+            if m is None:
+                break
+            best = min(best, index[m.group()])
+        return best
+
+
+class PostingList:
+    """某一错误类型的所有命中行，按文件顺序保存行号(从0开始)和字节偏移两列"""
+
+    __slots__ = ("lines", "offsets")
+
+    def __init__(self, lines=None, offsets=None):
+        self.lines = lines if lines is not None else array('Q')
+        self.offsets = offsets if offsets is not None else array('Q')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, line_no, offset):
+        self.lines.append(line_no)
+        self.offsets.append(offset)
+
+    def extend(self, other, line_base=0, offset_base=0):
+        """追加另一段的命中行，line_base/offset_base 为那一段起点在整个日志流中的行号和偏移"""
+        if line_base:
+            self.lines.extend(array('Q', (n + line_base for n in other.lines)))
+        else:
+            self.lines.extend(other.lines)
+        if offset_base:
+            self.offsets.extend(array('Q', (n + offset_base for n in other.offsets)))
+        else:
+            self.offsets.extend(other.offsets)
+
+    def page(self, page, page_size):
+        """取出第 page 页(从0开始)的行号和偏移"""
+        start = page * page_size
+        return self.lines[start:start + page_size], self.offsets[start:start + page_size]
+
+
+class LogParser:
+    """日志格式解析器基类：从一行中提取 (时间戳, 进程, 级别)，无法识别时返回 None"""
+
+    name = ""
+    pattern = None
+
+    def __init__(self):
+        self._last_time_text = None
+        self._last_time = math.nan
+
+    def parse(self, line):
+        m = self.pattern.match(line) if self.pattern is not None else None
+        if m is None:
+            return None
+        return self.parse_time(m.group("time")), m.group("process") or "", (m.group("level") or "").lower()
+
+    def parse_time(self, text):
+        # 相邻的日志行时间戳往往相同，缓存上一次的解析结果
+        if text != self._last_time_text:
+            self._last_time_text = text
+            try:
+                self._last_time = self.to_timestamp(text)
+            except (ValueError, OverflowError):
+                self._last_time = math.nan
+        return self._last_time
+
+    def to_timestamp(self, text):
+        return datetime.fromisoformat(text).timestamp()
+
+
+class MacUnifiedLogParser(LogParser):
+    """macOS `log show` 默认格式: 时间戳 线程 类型 活动 PID TTL 进程: 消息"""
+
+    name = "macos"
+    pattern = re.compile(
+        r"(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?:[+-]\d{2}:?\d{2})?)\s+"
+        r"0x[0-9a-fA-F]+\s+(?P<level>\w+)\s+0x[0-9a-fA-F]+\s+\d+\s+(?:\d+\s+)?"
+        r"(?P<process>[^:\[\s]+)")
+
+
+class SyslogParser(LogParser):
+    """BSD syslog (/var/log/system.log) 与 RFC 5424 格式，级别取自 PRI 中的 severity"""
+
+    name = "syslog"
+    pattern = re.compile(
+        r"(?:<(?P<pri>\d{1,3})>)?(?:"
+        r"1 (?P<iso>\S+) \S+ (?P<app>\S+)"
+        r"|(?P<bsd>[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}) \S+ (?P<proc>[^:\[\s]+))")
+    severities = ("emerg", "alert", "crit", "err", "warning", "notice", "info", "debug")
+    months = {m: i for i, m in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+    def __init__(self, year=None):
+        super().__init__()
+        self.year = year or datetime.now().year  # BSD 格式不带年份
+
+    def parse(self, line):
+        m = self.pattern.match(line)
+        if m is None:
+            return None
+        level = self.severities[int(m.group("pri")) % 8] if m.group("pri") else ""
+        if m.group("iso"):
+            return self.parse_time(m.group("iso")), m.group("app"), level
+        return self.parse_time(m.group("bsd")), m.group("proc"), level
+
+    def to_timestamp(self, text):
+        if text[:3] not in self.months:
+            return super().to_timestamp(text)
+        clock = text[7:].split(":")
+        return datetime(self.year, self.months[text[:3]], int(text[4:6]),
+                        int(clock[0]), int(clock[1]), int(clock[2])).timestamp()
+
+
+class JsonLinesParser(LogParser):
+    """每行一个 JSON 对象，按常见的字段名查找时间戳、进程和级别"""
+
+    name = "json"
+    time_keys = ("timestamp", "@timestamp", "time", "ts", "date")
+    process_keys = ("process", "proc", "app", "logger", "name", "service")
+    level_keys = ("level", "severity", "lvl", "loglevel")
+
+    def parse(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        timestamp = math.nan
+        for key in self.time_keys:
+            value = record.get(key)
+            if isinstance(value, (int, float)):
+                # 毫秒级的 epoch 时间戳换算成秒
+                timestamp = value / 1000.0 if value > 1e11 else float(value)
+                break
+            if isinstance(value, str):
+                timestamp = self.parse_time(value)
+                break
+        process = next((str(record[k]) for k in self.process_keys if k in record), "")
+        level = next((str(record[k]).lower() for k in self.level_keys if k in record), "")
+        return timestamp, process, level
+
+    def to_timestamp(self, text):
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+
+
+LOG_PARSERS = {cls.name: cls for cls in (MacUnifiedLogParser, SyslogParser, JsonLinesParser)}
+# 界面中的日志格式选项
+PARSER_CHOICES = ("无", "自动识别") + tuple(LOG_PARSERS)
+
+
+def detect_parser(path, sample_lines=50):
+    """读取文件开头的若干行，返回能解析最多行的格式名，都不匹配时返回 None"""
+    lines = []
+    stream, raw = open_log(path)
+    try:
+        for line in stream:
+            lines.append(line.decode("utf-8", "replace").rstrip("\n"))
+            if len(lines) >= sample_lines:
+                break
+    finally:
+        stream.close()
+        raw.close()
+    best, best_hits = None, 0
+    for name, cls in LOG_PARSERS.items():
+        parser = cls()
+        hits = sum(1 for line in lines if parser.parse(line) is not None)
+        if hits > best_hits:
+            best, best_hits = name, hits
+    return best
+
+
+class HitColumns:
+    """命中行的列式存储：时间戳、行号、偏移、错误类型、进程、级别各占一列，字符串列只存编号"""
+
+    def __init__(self):
+        self.timestamps = array('d')  # 无法解析的时间戳为 NaN
+        self.line_numbers = array('Q')
+        self.offsets = array('Q')
+        self.type_ids = array('H')
+        self.process_ids = array('I')
+        self.level_ids = array('H')
+        self.types = []
+        self.processes = [""]
+        self.levels = [""]
+        self._type_ids = {}
+        self._process_ids = {"": 0}
+        self._level_ids = {"": 0}
+        self._sorted = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @staticmethod
+    def _intern(table, ids, value):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(table)
+            table.append(value)
+        return index
+
+    def add(self, fields, error_type, line_no, offset):
+        timestamp, process, level = fields if fields is not None else (math.nan, "", "")
+        self.timestamps.append(timestamp)
+        self.line_numbers.append(line_no)
+        self.offsets.append(offset)
+        self.type_ids.append(self._intern(self.types, self._type_ids, error_type))
+        self.process_ids.append(self._intern(self.processes, self._process_ids, process))
+        self.level_ids.append(self._intern(self.levels, self._level_ids, level))
+
+    def extend(self, other, line_base=0, offset_base=0):
+        """追加另一段的结果，字符串编号按本表重新映射"""
+        type_map = [self._intern(self.types, self._type_ids, v) for v in other.types]
+        process_map = [self._intern(self.processes, self._process_ids, v) for v in other.processes]
+        level_map = [self._intern(self.levels, self._level_ids, v) for v in other.levels]
+        self.timestamps.extend(other.timestamps)
+        self.line_numbers.extend(array('Q', (n + line_base for n in other.line_numbers)))
+        if offset_base:
+            self.offsets.extend(array('Q', (n + offset_base for n in other.offsets)))
+        else:
+            self.offsets.extend(other.offsets)
+        self.type_ids.extend(array('H', (type_map[i] for i in other.type_ids)))
+        self.process_ids.extend(array('I', (process_map[i] for i in other.process_ids)))
+        self.level_ids.extend(array('H', (level_map[i] for i in other.level_ids)))
+
+    def row(self, i):
+        """第 i 条命中记录: (时间戳, 行号, 偏移, 错误类型, 进程, 级别)"""
+        return (self.timestamps[i], self.line_numbers[i], self.offsets[i], self.types[self.type_ids[i]],
+                self.processes[self.process_ids[i]], self.levels[self.level_ids[i]])
+
+    def _sorted_view(self):
+        # 按时间排序后的下标和时间戳，日志基本有序时直接复用；有新数据追加后重新生成
+        if self._sorted is None or self._sorted[0] != len(self):
+            timestamps = self.timestamps
+            valid = [i for i in range(len(timestamps)) if not math.isnan(timestamps[i])]
+            if any(timestamps[a] > timestamps[b] for a, b in zip(valid, valid[1:])):
+                valid.sort(key=timestamps.__getitem__)
+            order = array('Q', valid)
+            self._sorted = (len(self), order, array('d', (timestamps[i] for i in order)))
+        return self._sorted[1], self._sorted[2]
+
+    def time_span(self):
+        """返回可解析时间戳中最早和最晚的时间，没有时返回 None"""
+        sorted_times = self._sorted_view()[1]
+        return (sorted_times[0], sorted_times[-1]) if sorted_times else None
+
+    def select(self, start=None, end=None, error_type=None):
+        """用二分查找返回时间在 [start, end) 内的命中记录下标，按时间排序"""
+        order, sorted_times = self._sorted_view()
+        lo = 0 if start is None else bisect_left(sorted_times, start)
+        hi = len(order) if end is None else bisect_left(sorted_times, end)
+        if error_type is None:
+            return order[lo:hi]
+        type_id = self._type_ids.get(error_type)
+        return array('Q', (i for i in order[lo:hi] if self.type_ids[i] == type_id))
+
+    def histogram(self, bucket=60, start=None, end=None, error_type=None):
+        """按 bucket 秒(默认每分钟)统计命中数，返回 [(区间起始时间戳, 数量), ...]"""
+        counts = defaultdict(int)
+        timestamps = self.timestamps
+        for i in self.select(start, end, error_type):
+            counts[int(timestamps[i] // bucket) * bucket] += 1
+        return sorted(counts.items())
+
+
+class LogTemplate:
+    """一个消息模板：可变的位置用 <*> 表示，并记录首次出现的行号和偏移作为示例"""
+
+    __slots__ = ("key", "tokens", "count", "error_type", "line_no", "offset")
+
+    def __init__(self, key, tokens, count, error_type, line_no, offset):
+        self.key = key
+        self.tokens = tokens
+        self.count = count
+        self.error_type = error_type
+        self.line_no = line_no
+        self.offset = offset
+
+    @property
+    def text(self):
+        return " ".join(self.tokens)
+
+
+class TemplateMiner:
+    """Drain 风格的流式模板挖掘：屏蔽数字、IP 等可变部分后，按相似度把消息聚成模板
+
+    同一错误类型、相同词数、相同首词的消息才会比较相似度。模板总数超过 max_templates 时
+    淘汰最久未命中的模板，它的计数归入该错误类型的“其他模板”，内存占用因此有上限。
+    """
+
+    def __init__(self, max_templates=MAX_TEMPLATES, threshold=TEMPLATE_SIMILARITY):
+        self.max_templates = max_templates
+        self.threshold = threshold
+        self.clusters = OrderedDict()  # 模板编号 -> LogTemplate，按最近命中排序
+        self.groups = defaultdict(list)  # (错误类型, 词数, 首词) -> [模板编号]
+        self.evicted = defaultdict(int)
+        self._next_id = 0
+
+    def add(self, line, error_type, line_no, offset):
+        tokens = TEMPLATE_MASK.sub("<*>", line).split()
+        self.add_tokens(tokens, error_type, 1, line_no, offset)
+
+    def add_tokens(self, tokens, error_type, count, line_no, offset):
+        key = (error_type, len(tokens), tokens[0] if tokens else "")
+        group = self.groups[key]
+        best, best_sim, best_params = None, -1.0, -1
+        for cid in group:
+            template = self.clusters[cid]
+            same = params = 0
+            for a, b in zip(template.tokens, tokens):
+                if a == "<*>":
+                    params += 1
+                elif a == b:
+                    same += 1
+            sim = same / len(tokens) if tokens else 1.0
+            if sim > best_sim or (sim == best_sim and params > best_params):
+                best, best_sim, best_params = cid, sim, params
+
+        if best is not None and best_sim >= self.threshold:
+            template = self.clusters[best]
+            template.tokens = [a if a == b else "<*>" for a, b in zip(template.tokens, tokens)]
+            template.count += count
+            if line_no < template.line_no:
+                template.line_no, template.offset = line_no, offset
+            self.clusters.move_to_end(best)
+            return
+
+        if len(self.clusters) >= self.max_templates:
+            cid, old = self.clusters.popitem(last=False)
+            old_group = self.groups[old.key]
+            old_group.remove(cid)
+            if not old_group:
+                del self.groups[old.key]
+            self.evicted[old.error_type] += old.count
+            group = self.groups[key]
+        cid = self._next_id
+        self._next_id += 1
+        self.clusters[cid] = LogTemplate(key, list(tokens), count, error_type, line_no, offset)
+        group.append(cid)
+
+    def merge(self, other, line_base=0, offset_base=0):
+        """把另一段挖掘出的模板按权重并入，结果与顺序挖掘近似"""
+        for template in other.clusters.values():
+            self.add_tokens(template.tokens, template.error_type, template.count,
+                            template.line_no + line_base, template.offset + offset_base)
+        for error_type, count in other.evicted.items():
+            self.evicted[error_type] += count
+
+    def summary(self, limit=TEMPLATES_PER_TYPE):
+        """每种错误类型出现最多的 limit 个模板: {错误类型: [(模板, 数量, 首次行号, 偏移), ...]}"""
+        by_type = defaultdict(list)
+        for template in self.clusters.values():
+            by_type[template.error_type].append(template)
+        result = {}
+        for error_type, templates in by_type.items():
+            templates.sort(key=lambda t: t.count, reverse=True)
+            result[error_type] = [(t.text, t.count, t.line_no, t.offset) for t in templates[:limit]]
+        for error_type, count in self.evicted.items():
+            result.setdefault(error_type, []).append(("<其他模板>", count, None, None))
+        return result
+
+
+class LogStreamAnalyzer:
+    """流式日志分析引擎：按块读取文件，只保存匹配行的字节偏移
+
+    偏移是整个日志流(解压后、轮转序列首尾相连)中的位置，sources 记录每个文件在流中的起点。
+    """
+
+    def __init__(self, keywords, chunk_size=CHUNK_SIZE, matcher="trie", parser=None, templates=False):
+        self.matcher = KeywordMatcher(keywords, matcher)
+        self.mine_templates = templates
+        self.parser_name = parser
+        self.parser = LOG_PARSERS[parser]() if parser else None
+        self.keywords = self.matcher.keywords
+        self.error_types = [kw.capitalize() + " 错误" for kw in self.keywords]
+        self.chunk_size = chunk_size
+        self.index_sources = True  # 是否为压缩文件保存按偏移读取行的 GzipIndex/HitLineStore，子进程中不需要
+        self.reset()
+
+    def reset(self):
+        """清空所有统计结果，从头开始分析"""
+        self.error_stats = defaultdict(int)
+        self.postings = {}  # 错误类型 -> PostingList
+        self.columns = HitColumns() if self.parser is not None else None  # 指定解析器时才提取结构化字段
+        self.templates = TemplateMiner() if self.mine_templates else None
+        self.line_count = 0
+        self.bytes_read = 0  # 已分析的(解压后)字节数
+        self.source_read = 0  # 已读取的原始(压缩)字节数，与 total_size 一起计算进度
+        self.total_size = 0
+        self.sources = []  # [(在日志流中的起始偏移, 文件路径)]
+        self.gzip_indexes = {}  # gzip 文件路径 -> GzipIndex，按偏移读取命中行时使用
+        self.hit_lines = {}  # bz2/xz 文件路径 -> HitLineStore
+        self._hit_store = None  # 正在分析的 bz2/xz 文件的 HitLineStore
+        self._reader = None  # 上次读取 bz2/xz 文件后保持打开的 (文件路径, 流, 原始文件)，向后翻页时接着解压
+        self.cancelled = False
+        self._pending = b""  # 上一块末尾尚未结束的半行
+        self._pending_offset = 0
+        self._next_report = 0
+
+    def classify(self, line_lower):
+        """返回一行的错误类型，没有匹配任何关键词时返回 None"""
+        index = self.matcher.match(line_lower)
+        return None if index < 0 else self.error_types[index]
+
+    def _record(self, error_type, line_no, offset, line):
+        posting = self.postings.get(error_type)
+        if posting is None:
+            posting = self.postings[error_type] = PostingList()
+        posting.add(line_no, offset)
+        self.error_stats[error_type] += 1
+        if self._hit_store is not None:
+            self._hit_store.add(offset, line + b"\n")
+        if self.columns is not None or self.templates is not None:
+            text = line.decode("utf-8", "replace")
+            if self.columns is not None:
+                self.columns.add(self.parser.parse(text), error_type, line_no, offset)
+            if self.templates is not None:
+                self.templates.add(text, error_type, line_no, offset)
+
+    def feed(self, data):
+        """送入一段新数据，只处理其中完整的行，半行留到下一次"""
+        self.bytes_read += len(data)
+        if self._pending:
+            data = self._pending + data
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            self._pending = data
+            return
+        self._scan_block(data[:cut], self._pending_offset)
+        self._pending = data[cut + 1:]
+        self._pending_offset += cut + 1
+
+    def finish(self):
+        """处理文件末尾没有换行符的最后一行"""
+        if self._pending:
+            self._scan_block(self._pending, self._pending_offset)
+            self._pending_offset += len(self._pending)
+            self._pending = b""
+
+    def _scan_block(self, block, offset):
+        # block 不含最后的换行符，offset 是 block 第一个字节在文件中的位置
+        if self.matcher.bytes_pattern is not None and block.isascii():
+            self._scan_ascii_block(block, offset)
+            return
+        for line in block.split(b"\n"):
+            error_type = self.classify(line.decode("utf-8", "replace").lower())
+            if error_type is not None:
+                self._record(error_type, self.line_count, offset, line)
+            offset += len(line) + 1
+            self.line_count += 1
+
+    def _scan_ascii_block(self, block, offset):
+        # 纯 ASCII 的块直接在字节上整体查找，只有命中的行才需要 Python 层处理
+        text = block.lower()
+        search = self.matcher.bytes_pattern.search
+        resolve = self.matcher.resolve
+        line_no = self.line_count
+        counted = 0  # line_no 对应的行首位置，行号只对新增的部分增量计数
+        pos = 0
+        while True:
+            m = search(text, pos)
+            if m is None:
+                break
+            line_start = max(pos, text.rfind(b"\n", pos, m.start()) + 1)
+            line_no += text.count(b"\n", counted, line_start)
+            counted = line_start
+            line_end = text.find(b"\n", m.end())
+            if line_end < 0:
+                line_end = len(text)
+            self._record(self.error_types[resolve(search, text, m, line_end)], line_no, offset + line_start,
+                         block[line_start:line_end])
+            pos = line_end + 1
+            if pos >= len(text):
+                break
+        self.line_count += text.count(b"\n") + 1
+
+    def _consume(self, path, progress, stop_event, progress_bytes):
+        """把一个(可能是压缩的)文件的内容送入分析，被取消时返回 False"""
+        self.sources.append((self._pending_offset, path))
+        raw_start = self.source_read
+        stream, raw = open_log(path)
+        chunks = iter(lambda: stream.read(self.chunk_size), b"")
+        if self.index_sources and isinstance(stream, gzip.GzipFile):
+            # gzip 文件边分析边保存解压检查点，之后查看命中行时不必从头解压
+            index = self.gzip_indexes[path] = GzipIndex()
+            chunks = index.build(raw)
+        elif self.index_sources and stream is not raw:
+            self._hit_store = self.hit_lines[path] = HitLineStore()
+        try:
+            for chunk in chunks:
+                if stop_event is not None and stop_event.is_set():
+                    self.cancelled = True
+                    return False
+                self.feed(chunk)
+                self.source_read = raw_start + raw.tell()
+                if progress is not None and self.source_read >= self._next_report:
+                    progress(self)
+                    self._next_report = self.source_read + progress_bytes
+            # 每个文件都以完整的行结束，不与下一个文件的开头拼接
+            self.finish()
+        finally:
+            self._hit_store = None
+            if hasattr(chunks, "close"):
+                chunks.close()
+            stream.close()
+            raw.close()
+        return True
+
+    def analyze_file(self, path, progress=None, stop_event=None, progress_bytes=PROGRESS_BYTES):
+        """
+        按固定大小的块流式分析整个文件，gzip/bz2/xz 压缩的文件边读边解压。
+
+        :param progress: 每读取 progress_bytes 字节调用一次 progress(self)，结束时再调用一次
+        :param stop_event: threading.Event，置位后尽快停止并把 cancelled 设为 True
+        """
+        return self.analyze_series([path], progress, stop_event, progress_bytes=progress_bytes)
+
+    def analyze_series(self, paths, progress=None, stop_event=None, parallel=False, workers=None,
+                       progress_bytes=PROGRESS_BYTES):
+        """把一组文件(如轮转序列)当作首尾相连的一个日志流分析，parallel 时每个文件交给一个进程"""
+        self.total_size = sum(os.path.getsize(path) for path in paths)
+        self._next_report = self.source_read + progress_bytes
+        workers = workers or os.cpu_count() or 1
+        if parallel and len(paths) > 1 and workers > 1:
+            tasks = [(path, 0, None, self.keywords, self.matcher.mode, self.chunk_size, self.parser_name,
+                      self.mine_templates)
+                     for path in paths]
+            return self._merge_tasks(tasks, list(paths), workers, progress, stop_event)
+
+        for path in paths:
+            if not self._consume(path, progress, stop_event, progress_bytes):
+                return self
+        if progress is not None:
+            progress(self)
+        return self
+
+    def analyze_range(self, path, start, end):
+        """分析未压缩文件中 [start, end) 这一段，start 必须位于行首"""
+        self._pending_offset = start
+        self.sources.append((0, path))
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                self.feed(chunk)
+        self.finish()
+        self.source_read = self.bytes_read
+        return self
+
+    def merge(self, postings, columns, templates, line_count, bytes_read, source_read, offset_base=0):
+        """合并另一段的分析结果，各段需按日志流中的顺序依次合并"""
+        if self.columns is not None and columns is not None:
+            self.columns.extend(columns, self.line_count, offset_base)
+        if self.templates is not None and templates is not None:
+            self.templates.merge(templates, self.line_count, offset_base)
+        for error_type, (lines, offsets) in postings.items():
+            posting = self.postings.get(error_type)
+            if posting is None:
+                posting = self.postings[error_type] = PostingList()
+            posting.extend(PostingList(lines, offsets), self.line_count, offset_base)
+            self.error_stats[error_type] += len(offsets)
+        self.line_count += line_count
+        self.bytes_read += bytes_read
+        self.source_read += source_read
+
+    def _merge_tasks(self, tasks, sources, workers, progress, stop_event):
+        # sources 为每个任务对应的文件，整文件任务的偏移要平移到它在日志流中的起点
+        with multiprocessing.Pool(workers) as pool:
+            # imap 按提交顺序返回结果，保证倒排列表仍然有序
+            for task, source, result in zip(tasks, sources, pool.imap(_analyze_range_task, tasks)):
+                if stop_event is not None and stop_event.is_set():
+                    self.cancelled = True
+                    pool.terminate()
+                    return self
+                whole_file = task[2] is None
+                if whole_file:
+                    self.sources.append((self.bytes_read, source))
+                elif not self.sources:
+                    self.sources.append((0, source))
+                self.merge(*result, offset_base=self.bytes_read if whole_file else 0)
+                if progress is not None:
+                    progress(self)
+        self._pending_offset = self.bytes_read
+        return self
+
+    def analyze_file_parallel(self, path, workers=None, progress=None, stop_event=None):
+        """
+        把文件切成按行对齐的若干段，用多进程池并行分析后按顺序合并，结果与 analyze_file 完全一致。
+
+        文件较小、是压缩文件或只有一个进程可用时直接退回顺序分析。
+        """
+        workers = workers or os.cpu_count() or 1
+        self.total_size = os.path.getsize(path)
+        if workers <= 1 or self.total_size < PARALLEL_MIN_SIZE or is_compressed(path):
+            return self.analyze_file(path, progress=progress, stop_event=stop_event)
+
+        parts = max(workers * 4, self.total_size // RANGE_BYTES + 1)
+        ranges = split_ranges(path, parts)
+        tasks = [(path, start, end, self.keywords, self.matcher.mode, self.chunk_size, self.parser_name,
+                  self.mine_templates)
+                 for start, end in ranges]
+        return self._merge_tasks(tasks, [path] * len(tasks), workers, progress, stop_event)
+
+    def read_lines(self, offsets):
+        """
+        根据日志流中的偏移按需读取对应的行，压缩文件和轮转序列会映射回各自的文件。
+
+        gzip 文件从 GzipIndex 中最近的检查点解压，同一文件的各行一次读出；bz2/xz 文件的命中行
+        分析时已存入 HitLineStore。都没有时(并行分析的 bz2/xz)保持文件打开，
+        下次读取更靠后的行(如向后翻页)时接着解压，更靠前时才从头开始。
+        """
+        bases = [base for base, _ in self.sources]
+        located = []
+        gzip_positions = defaultdict(list)
+        formats = {}
+        for offset in offsets:
+            i = max(0, bisect_right(bases, offset) - 1)
+            located.append((offset, i))
+            if i not in formats:
+                formats[i] = compression_of(self.sources[i][1])
+            if formats[i] == "gzip":
+                gzip_positions[i].append(offset - bases[i])
+        gzip_lines = {}
+        for i, positions in gzip_positions.items():
+            path = self.sources[i][1]
+            index = self.gzip_indexes.get(path)
+            if index is None:  # 并行分析时在子进程中读取，没有建立检查点
+                index = self.gzip_indexes[path] = GzipIndex()
+            with open(path, "rb") as raw:
+                gzip_lines[i] = iter(index.readlines(raw, positions))
+
+        opened = {}
+        try:
+            for offset, i in located:
+                path = self.sources[i][1]
+                store = self.hit_lines.get(path)
+                line = store.get(offset) if store is not None else None
+                if i in gzip_lines:
+                    line = next(gzip_lines[i])
+                elif line is None:
+                    if i not in opened:
+                        opened[i] = self._open_reader(path, offset - bases[i])
+                    stream, raw = opened[i]
+                    stream.seek(offset - bases[i])
+                    line = stream.readline()
+                yield line.decode("utf-8", "replace")
+        finally:
+            for i, (stream, raw) in opened.items():
+                if stream is raw:
+                    stream.close()
+                    raw.close()
+                else:
+                    self._keep_reader(self.sources[i][1], stream, raw)
+
+    def _open_reader(self, path, position):
+        """打开要读取的文件；上次保持打开的 bz2/xz 流还没读过 position 时直接接着用"""
+        reader, self._reader = self._reader, None
+        if reader is not None:
+            if reader[0] == path and reader[1].tell() <= position:
+                return reader[1], reader[2]
+            reader[1].close()
+            reader[2].close()
+        return open_log(path)
+
+    def _keep_reader(self, path, stream, raw):
+        if self._reader is not None:
+            self._reader[1].close()
+            self._reader[2].close()
+        self._reader = (path, stream, raw)
+
+    @property
+    def error_count(self):
+        return sum(self.error_stats.values())
+
+
+class LogFollower:
+    """跟踪不断追加的日志文件：记住已读的位置和 inode，每次只分析新增的字节"""
+
+    def __init__(self, path, analyzer):
+        self.path = path
+        self.analyzer = analyzer
+        self.rotations = 0
+        self._file = None
+        self._inode = None
+
+    def _reopen(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "rb")
+        st = os.fstat(self._file.fileno())
+        self._inode = (st.st_dev, st.st_ino)
+        self.analyzer.reset()
+        self.analyzer.sources = [(0, self.path)]
+
+    def poll(self, progress=None, stop_event=None, progress_bytes=PROGRESS_BYTES):
+        """
+        分析自上次以来新增的数据，返回新读取的字节数。
+
+        文件被轮转(inode 变化)或截断(变小)时从新文件开头重新统计。
+        末尾还没写完的半行会留到下一次再处理。
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0  # 轮转过程中新文件可能还没创建
+        if self._file is None or (st.st_dev, st.st_ino) != self._inode:
+            if self._file is not None:
+                self.rotations += 1
+            self._reopen()
+        elif st.st_size < self.analyzer.bytes_read:
+            self.rotations += 1
+            self._reopen()
+
+        analyzer = self.analyzer
+        analyzer.total_size = max(st.st_size, analyzer.bytes_read)
+        start = analyzer.bytes_read
+        next_report = start + progress_bytes
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+            chunk = self._file.read(analyzer.chunk_size)
+            if not chunk:
+                break
+            analyzer.feed(chunk)
+            analyzer.source_read = analyzer.bytes_read
+            if progress is not None and analyzer.bytes_read >= next_report:
+                analyzer.total_size = max(analyzer.total_size, analyzer.bytes_read)
+                progress(analyzer)
+                next_report = analyzer.bytes_read + progress_bytes
+        analyzer.total_size = max(analyzer.total_size, analyzer.bytes_read)
+        return analyzer.bytes_read - start
+
+    def follow(self, progress=None, stop_event=None, interval=1.0):
+        """持续轮询直到 stop_event 置位，有新数据或文件被轮转时调用 progress"""
+        try:
+            while stop_event is None or not stop_event.is_set():
+                rotations = self.rotations
+                if self.poll(progress, stop_event) or rotations != self.rotations:
+                    if progress is not None:
+                        progress(self.analyzer)
+                if stop_event is None:
+                    time.sleep(interval)
+                else:
+                    stop_event.wait(interval)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def split_ranges(path, parts):
+    """把文件切成约 parts 段，每段的边界都落在换行符之后"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            pos = size * i // parts
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos - 1)
+            f.readline()  # 跳到下一行的行首
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _analyze_range_task(task):
+    # 在子进程中执行，只返回可以序列化的结果
+    # end 为 None 时分析整个(可能压缩的)文件
+    path, start, end, keywords, matcher, chunk_size, parser, templates = task
+    analyzer = LogStreamAnalyzer(keywords, chunk_size, matcher, parser, templates)
+    analyzer.index_sources = False
+    if end is None:
+        analyzer.analyze_file(path)
+    else:
+        analyzer.analyze_range(path, start, end)
+    postings = {t: (p.lines, p.offsets) for t, p in analyzer.postings.items()}
+    return (postings, analyzer.columns, analyzer.templates, analyzer.line_count, analyzer.bytes_read,
+            analyzer.source_read)
+
+
+class LineIndex:
+    """
+    稀疏行偏移索引：每隔 step 行记录一次行首偏移，可以快速定位任意一行。
+
+    读取都用带偏移的 pread(或加锁的 seek+read)，不使用 mmap：跟踪模式下文件随时可能被截断，
+    读到文件末尾之外只会得到较短的数据，而 mmap 映射的区域被截断后访问会直接让进程收到 SIGBUS。
+    """
+
+    def __init__(self, path, step=INDEX_STEP):
+        self.path = path
+        self.step = step
+        self.checkpoints = array('Q', [0])
+        self.line_count = 0
+        self.complete = False
+        self._file = None
+        self._inode = None
+        self._size = 0  # 已建立索引的字节数
+        self._read_lock = threading.Lock()
+        self._skip = re.compile(rb"(?:[^\n]*\n){%d}" % step)
+        self._open()
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "rb")
+        st = os.fstat(self._file.fileno())
+        self._inode = (st.st_dev, st.st_ino)
+        self._size = 0
+        self.checkpoints = array('Q', [0])
+        self.line_count = 0
+
+    def _read(self, offset, size):
+        """从 offset 处读取至多 size 字节，到达文件末尾时返回较短的数据"""
+        if hasattr(os, "pread"):
+            return os.pread(self._file.fileno(), size, offset)
+        with self._read_lock:  # Windows 没有 pread，界面线程和建索引的线程共用文件位置
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def update(self, stop_event=None):
+        """从上次建到的位置继续建立索引；文件追加内容后再次调用即可增量更新，轮转或截断时重建"""
+        try:
+            st = os.stat(self.path)
+            if (st.st_dev, st.st_ino) != self._inode or st.st_size < self._size:
+                self._open()
+        except FileNotFoundError:
+            pass
+        self.complete = False
+
+        match = self._skip.match
+        pos = self.checkpoints[-1]
+        buffer_start, buffer = pos, b""
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return
+            m = match(buffer, pos - buffer_start)
+            if m is not None:
+                pos = buffer_start + m.end()
+                self.checkpoints.append(pos)
+                self.line_count = (len(self.checkpoints) - 1) * self.step
+                continue
+            chunk = self._read(buffer_start + len(buffer), CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer = buffer[pos - buffer_start:] + chunk
+            buffer_start = pos
+
+        # 最后不足 step 行的部分直接计数
+        tail = buffer[pos - buffer_start:]
+        self._size = buffer_start + len(buffer)
+        self.line_count = (len(self.checkpoints) - 1) * self.step + tail.count(b"\n")
+        if tail and not tail.endswith(b"\n"):
+            self.line_count += 1
+        self.complete = True
+
+    def lines(self, start, count):
+        """读取从第 start 行(从0开始)起的 count 行"""
+        if self._file is None or count <= 0:
+            return []
+        checkpoint = min(start // self.step, len(self.checkpoints) - 1)
+        pos = self.checkpoints[checkpoint]
+        skip = start - checkpoint * self.step
+
+        result = []
+        pending = b""
+        while len(result) < count:
+            chunk = self._read(pos, DETAIL_READ)
+            if not chunk:
+                if pending and not skip:
+                    result.append(pending.decode("utf-8", "replace"))  # 最后一行没有换行符
+                break
+            pos += len(chunk)
+            parts = (pending + chunk).split(b"\n")
+            pending = parts.pop()
+            for part in parts:
+                if skip:
+                    skip -= 1
+                elif len(result) < count:
+                    result.append(part.decode("utf-8", "replace"))
+        return result
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def compare_matchers(path, keywords, modes=MATCHER_MODES):
+    """用不同的匹配算法分析同一个文件，返回各自的耗时和统计结果，便于对比"""
+    results = {}
+    for mode in modes:
+        start = time.perf_counter()
+        analyzer = LogStreamAnalyzer(keywords, matcher=mode).analyze_file(path)
+        results[mode] = (time.perf_counter() - start, dict(analyzer.error_stats))
+    return results
+
+
+def expand_paths(patterns):
+    """展开命令行中的文件名和通配符(支持 **)，去掉重复和不存在的文件，保持输入顺序"""
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        matches = [path for path in matches if os.path.isfile(path)]
+        if not matches:
+            print(f"警告: 没有匹配的文件: {pattern}", file=sys.stderr)
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def analyze_job(job):
+    """在子进程中分析一个文件(或它的轮转序列)，返回可以直接序列化为 JSON 的结果"""
+    path, keywords, matcher, parser, templates, series, histogram = job
+    result = {"path": path, "files": [path], "parser": None if parser == "auto" else parser}
+    try:
+        # 查找轮转文件和识别格式也要读文件，出错同样只记在这个文件上
+        result["files"] = paths = find_rotation_series(path) if series else [path]
+        if parser == "auto":
+            result["parser"] = parser = detect_parser(path)
+        analyzer = LogStreamAnalyzer(keywords, matcher=matcher, parser=parser, templates=templates)
+        analyzer.analyze_series(paths)
+    except (OSError, EOFError, ValueError, zlib.error, lzma.LZMAError) as e:
+        # 截断或损坏的压缩文件只记为这个文件的错误，不影响批量中的其他文件
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    result.update(lines=analyzer.line_count, bytes=analyzer.bytes_read, errors=analyzer.error_count,
+                  stats=dict(analyzer.error_stats))
+    if analyzer.templates is not None:
+        result["templates"] = {
+            error_type: [{"template": text, "count": count, "line": None if line_no is None else line_no + 1}
+                         for text, count, line_no, _ in rows]
+            for error_type, rows in analyzer.templates.summary().items()
+        }
+    if histogram and analyzer.columns is not None:
+        result["histogram"] = [[datetime.fromtimestamp(minute).strftime("%Y-%m-%d %H:%M"), count]
+                               for minute, count in analyzer.columns.histogram()]
+    return result
+
+
+def run_batch(paths, keywords=DEFAULT_KEYWORDS, matcher="trie", parser=None, templates=False, series=False,
+              histogram=False, workers=None):
+    """
+    并发分析多个文件，按输入顺序逐个产出结果。
+
+    每个文件交给一个进程顺序分析，文件数量很多时比单个文件内部再拆分更划算。
+
+    :param parser: 解析器名称，"auto" 表示每个文件单独识别，None 表示不解析
+    :param workers: 进程数，默认等于 CPU 核数；为 1 时在当前进程中依次分析
+    """
+    jobs = [(path, list(keywords), matcher, parser, templates, series, histogram) for path in paths]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        for job in jobs:
+            yield analyze_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(analyze_job, jobs)
+
+
+def write_json(results, output):
+    """每个文件一行 JSON(JSON Lines)，便于边分析边输出和用 jq 等工具处理"""
+    for result in results:
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+
+
+def write_csv(results, output):
+    """每个文件的每种错误类型一行：path,error_type,count；读取失败的文件 error_type 为 "<读取失败>" """
+    writer = csv.writer(output)
+    writer.writerow(("path", "error_type", "count"))
+    for result in results:
+        if "error" in result:
+            writer.writerow((result["path"], "<读取失败>", result["error"]))
+            continue
+        writer.writerow((result["path"], "<总行数>", result["lines"]))
+        for error_type, count in sorted(result["stats"].items(), key=lambda x: x[1], reverse=True):
+            writer.writerow((result["path"], error_type, count))
+        output.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量分析日志文件中的错误，输出 JSON 或 CSV 统计")
+    parser.add_argument("patterns", nargs="+", metavar="FILE", help="日志文件或通配符，如 '/var/log/**/*.log'")
+    parser.add_argument("-k", "--keywords", default=",".join(DEFAULT_KEYWORDS),
+                        help="逗号分隔的错误关键词 (默认: %(default)s)")
+    parser.add_argument("-m", "--matcher", choices=MATCHER_MODES, default="trie", help="关键词匹配算法")
+    parser.add_argument("-p", "--parser", choices=("auto",) + tuple(LOG_PARSERS),
+                        help="日志格式，auto 为自动识别；不指定时不解析时间等字段")
+    parser.add_argument("-t", "--templates", action="store_true", help="对错误消息做模板聚类")
+    parser.add_argument("-s", "--series", action="store_true", help="同时分析每个文件的轮转文件(.1 .2.gz ...)")
+    parser.add_argument("--histogram", action="store_true", help="输出每分钟的错误数量(需要 --parser)")
+    parser.add_argument("-f", "--format", choices=("json", "csv"), default="json", help="输出格式")
+    parser.add_argument("-o", "--output", help="输出文件，默认写到标准输出")
+    parser.add_argument("-j", "--workers", type=int, help="并发进程数，默认等于 CPU 核数")
+    args = parser.parse_args(argv)
+
+    keywords = [kw.strip().lower() for kw in args.keywords.split(",") if kw.strip()]
+    if not keywords:
+        parser.error("至少需要一个关键词")
+    paths = expand_paths(args.patterns)
+    if not paths:
+        parser.error("没有找到匹配的日志文件")
+
+    results = run_batch(paths, keywords, args.matcher, args.parser, args.templates, args.series, args.histogram,
+                        args.workers)
+    writer = write_csv if args.format == "csv" else write_json
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as output:
+            writer(results, output)
+    else:
+        writer(results, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+代理池(8-ProxyTool.py)的离线性能测试，不需要访问外网。
+
+在子进程中启动本地的替身上游代理和目标网站，可以设置延迟和失败率，然后测量：
+- 批量测试代理的吞吐量(冷启动和复用连接两种情况)
+- 各种选择策略每秒能选出多少个代理(包括健康状态不断变化时)
+- 代理存储的增删改和加载耗时
+
+每项指标在 1k、10k、100k 个代理的规模下分别测量。结果可以保存为基准，之后再运行时与基准对比，
+变差超过阈值的指标会被标出，并以非零状态退出，便于在修改后检查性能回退:
+
+    python proxy_benchmark.py --save-baseline bench.json
+    python proxy_benchmark.py --baseline bench.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 批量测试的每个代理都是一个只监听 127.0.0.1 的替身代理，各用一个端口。替身代理进程中每个代理
+# 需要的文件描述符数(监听端口、保持的客户端连接、到目标网站的连接及目标网站一侧)，以及额外预留的数量
+STANDIN_FDS = 4
+STANDIN_FD_RESERVE = 256
+# 批量测试时抽取的代理数，测试吞吐量与代理池大小基本无关
+CHECK_SAMPLE = 1000
+SELECT_OPS = 100000
+# 有健康状态变化时，每选择这么多次更新一次某个代理的状态
+CHURN_EVERY = 100
+REGRESSION_THRESHOLD = 0.2
+
+
+def load_proxy_tool():
+    """按文件路径加载 8-ProxyTool.py(文件名不是合法的模块名)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "8-ProxyTool.py")
+    spec = importlib.util.spec_from_file_location("proxy_tool", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["proxy_tool"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def raise_fd_limit(needed):
+    """
+    尽量把打开文件数的软限制提高到 needed(不超过硬限制)，macOS 默认只有 256。
+
+    :return: 提高后的软限制，无法得知时返回 None
+    """
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return None if soft == resource.RLIM_INFINITY else soft
+
+
+def run_standins(ports, ready, latency, jitter, failure_rate, target_latency):
+    """
+    子进程入口：启动目标网站和 ports 个替身上游代理(都只监听 127.0.0.1)，
+    把监听的端口放进 ready 队列后一直运行；启动失败时放入异常信息。
+
+    替身代理收到请求后，按 failure_rate 的概率直接断开连接，否则等待 latency±jitter 秒，
+    再通过保持的连接把请求转发给目标网站。
+    """
+    tool = load_proxy_tool()
+
+    async def handle_target(reader, writer):
+        try:
+            while True:
+                start, headers = await tool.read_head(reader)
+                if start is None:
+                    break
+                if target_latency:
+                    await asyncio.sleep(target_latency)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_proxy(reader, writer, target_port):
+        upstream = None
+        try:
+            while True:
+                start, headers = await tool.read_head(reader)
+                if start is None:
+                    break
+                if random.random() < failure_rate:
+                    break
+                await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+                if upstream is None:
+                    upstream = await asyncio.open_connection("127.0.0.1", target_port)
+                method, _, version = start.split(" ", 2)
+                path = "/" + start.split(" ", 2)[1].split("://", 1)[-1].partition("/")[2]
+                body = b"".join([part async for part in tool.iter_body(reader, headers)])
+                upstream[1].write(tool.encode_head(f"{method} {path} {version}", headers) + body)
+                await upstream[1].drain()
+                status, response_headers = await tool.read_head(upstream[0])
+                writer.write(tool.encode_head(status, response_headers))
+                async for part in tool.iter_body(upstream[0], response_headers):
+                    writer.write(part)
+                await writer.drain()
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if upstream is not None:
+                upstream[1].close()
+            writer.close()
+
+    async def main():
+        needed = ports * STANDIN_FDS + STANDIN_FD_RESERVE
+        limit = raise_fd_limit(needed)
+        if limit is not None and limit < needed:
+            ready.put(f"{ports} 个替身代理需要 {needed} 个文件描述符，上限只有 {limit}，请减小 --check-sample")
+            return
+        try:
+            target = await asyncio.start_server(handle_target, "127.0.0.1", 0)
+            target_port = target.sockets[0].getsockname()[1]
+            servers = []
+            for _ in range(ports):
+                servers.append(await asyncio.start_server(lambda r, w: handle_proxy(r, w, target_port),
+                                                          "127.0.0.1", 0, backlog=4096))
+        except OSError as e:
+            ready.put(f"启动 {ports} 个替身代理失败: {e}")
+            return
+        ready.put((target_port, [server.sockets[0].getsockname()[1] for server in servers]))
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def proxy_address(i, ports=None):
+    """
+    第 i 个代理的地址。
+
+    给出 ports 时是第 i 个替身代理(127.0.0.1 上的不同端口)；否则是不会真正连接的地址，
+    只用于存储和选择的测试，主机名在 10.0.0.0/8 中依次取
+    """
+    if ports is not None:
+        return f"http://127.0.0.1:{ports[i]}"
+    return f"http://10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}:8080"
+
+
+def fill_pool(tool, pool, size, ports=None):
+    for i in range(size):
+        pool.put(tool.new_record(proxy_address(i, ports), "http", True, random.uniform(0.05, 1.0), ""))
+
+
+def rate(count, seconds):
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def bench_checks(tool, workdir, ports, target_port, sample, workers, timeout):
+    """批量测试的吞吐量：第一轮要新建连接，第二轮复用会话里保持的连接"""
+    pool = tool.ProxyPool(os.path.join(workdir, "check.json"))
+    with pool.batch():
+        fill_pool(tool, pool, sample, ports)
+    test_url = f"http://127.0.0.1:{target_port}/"
+    results = {}
+    for name in ("cold", "warm"):
+        start = time.perf_counter()
+        pool.test_all_proxies(test_url, timeout=timeout, workers=workers, per_host=workers,
+                              proxies=list(pool.records))
+        elapsed = time.perf_counter() - start
+        results[f"check/{name}_ops"] = rate(sample, elapsed)
+    results["check/working_ratio"] = len(pool.by_status[True]) / sample
+    return results
+
+
+def bench_store(tool, workdir, size):
+    """存储的增删改和加载：批量添加、单条追加、状态更新、删除、从快照加操作日志加载"""
+    results = {}
+    filename = os.path.join(workdir, f"store-{size}.json")
+    pool = tool.ProxyPool(filename)
+
+    start = time.perf_counter()
+    with pool.batch():
+        fill_pool(tool, pool, size)
+    results["store/put_batch_ops"] = rate(size, time.perf_counter() - start)
+
+    singles = min(size, 1000)
+    start = time.perf_counter()
+    for i in range(singles):
+        pool.put(tool.new_record(f"http://10.0.{i // 256}.{i % 256}:1", "socks5", True, 0.1, ""))
+    results["store/put_single_ops"] = rate(singles, time.perf_counter() - start)
+
+    proxies = list(pool.records)
+    updates = min(size, 10000)
+    start = time.perf_counter()
+    with pool.batch():
+        for i in range(updates):
+            pool.update_status(proxies[i % len(proxies)], i % 7 != 0, 0.2, "")
+    results["store/update_ops"] = rate(updates, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for proxy in proxies[:singles]:
+        pool.remove_proxy(proxy)
+    results["store/remove_ops"] = rate(singles, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tool.ProxyPool(filename)
+    results["store/load_s"] = time.perf_counter() - start
+    return pool, results
+
+
+def bench_select(tool, pool):
+    """每种选择策略的选择速度，以及每选择 CHURN_EVERY 次就有一个代理状态变化时的速度"""
+    results = {}
+    proxies = list(pool.records)
+    for strategy in tool.SELECTION_STRATEGIES:
+        pool.select_proxy("http", strategy)  # 先建立选择结构，不计入耗时
+        start = time.perf_counter()
+        for _ in range(SELECT_OPS):
+            pool.select_proxy("http", strategy)
+        results[f"select/{strategy}_ops"] = rate(SELECT_OPS, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with pool.batch():
+            for i in range(SELECT_OPS):
+                if i % CHURN_EVERY == 0:
+                    pool.update_status(random.choice(proxies), random.random() < 0.9, random.uniform(0.05, 1.0), "")
+                pool.select_proxy("http", strategy)
+        results[f"select/{strategy}_churn_ops"] = rate(SELECT_OPS, time.perf_counter() - start)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基准比较，返回变差超过 threshold 的指标 [(名称, 基准值, 当前值)]；_s 结尾的指标越小越好，其余越大越好"""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old or name.endswith("working_ratio"):
+            continue
+        worse = value > old * (1 + threshold) if name.endswith("_s") else value < old * (1 - threshold)
+        if worse:
+            regressions.append((name, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="代理池离线性能测试")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="代理池规模，逗号分隔 (默认: %(default)s)")
+    parser.add_argument("--check-sample", type=int, default=CHECK_SAMPLE, help="批量测试时测试的代理数")
+    parser.add_argument("--workers", type=int, default=100, help="批量测试的并发数")
+    parser.add_argument("--timeout", type=float, default=2, help="单个代理的测试超时(秒)")
+    parser.add_argument("--latency", type=float, default=0.02, help="替身代理的平均延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="替身代理延迟的随机浮动(秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="替身代理直接断开连接的概率")
+    parser.add_argument("--target-latency", type=float, default=0.0, help="目标网站的响应延迟(秒)")
+    parser.add_argument("--skip-checks", action="store_true", help="不测量批量测试的吞吐量")
+    parser.add_argument("--baseline", help="与这个基准文件比较，变差的指标会被标出")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基准文件")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="变差多少算回退 (默认: %(default)s)")
+    args = parser.parse_args(argv)
+
+    tool = load_proxy_tool()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = {}
+    standins = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if not args.skip_checks:
+                ready = multiprocessing.Queue()
+                standins = multiprocessing.Process(
+                    target=run_standins,
+                    args=(args.check_sample, ready, args.latency, args.jitter, args.failure_rate,
+                          args.target_latency),
+                    daemon=True)
+                standins.start()
+                started = ready.get(timeout=30)
+                if isinstance(started, str):
+                    parser.exit(1, started + "\n")
+                target_port, ports = started
+                print(f"批量测试 {args.check_sample} 个代理...", file=sys.stderr)
+                results.update(bench_checks(tool, workdir, ports, target_port, args.check_sample, args.workers,
+                                            args.timeout))
+            for size in sizes:
+                print(f"代理池规模 {size}...", file=sys.stderr)
+                pool, store_results = bench_store(tool, workdir, size)
+                size_results = dict(store_results, **bench_select(tool, pool))
+                results.update({f"{size}/{name}": value for name, value in size_results.items()})
+        finally:
+            if standins is not None:
+                standins.terminate()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    flagged = {name for name, _, _ in regressions}
+
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        mark = "  <-- 回退" if name in flagged else ""
+        print(f"{name:<{width}}  {value:>14,.3f}{mark}")
+    for name, old, value in regressions:
+        print(f"回退: {name} 基准 {old:,.3f}，本次 {value:,.3f}", file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
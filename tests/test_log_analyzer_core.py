@@ -0,0 +1,94 @@
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_analyzer_core  # noqa: E402
+from log_analyzer_core import (MATCHER_MODES, KeywordMatcher, LogStreamAnalyzer, analyze_job,  # noqa: E402
+                                compare_matchers, main)
+
+# 故意让关键词互相包含、在同一行中先后出现，检查各算法都按关键词顺序归类
+KEYWORDS = ["fatal", "rror", "error", "warn", "warning", "timeout", "错误"]
+
+LINES = [
+    "2024-01-01 00:00:00 error: disk full, fatal",
+    "2024-01-01 00:00:01 warning then error",
+    "2024-01-01 00:00:02 WARNING: connection timeout",
+    "2024-01-01 00:00:03 timeout after warn",
+    "2024-01-01 00:00:04 all good",
+    "2024-01-01 00:00:05 Error and Fatal",
+    "2024-01-01 00:00:06 warn",
+    "2024-01-01 00:00:07 发生错误 timeout warning",
+    "2024-01-01 00:00:08 发生错误",
+    "2024-01-01 00:00:09 no newline at end: timeout, error",
+]
+
+
+def test_trie_uses_keyword_order():
+    trie = KeywordMatcher(KEYWORDS, "trie")
+    naive = KeywordMatcher(KEYWORDS, "naive")
+    for line in LINES:
+        assert trie.match(line.lower()) == naive.match(line.lower()), line
+
+
+def test_matchers_produce_identical_stats(tmp_path):
+    ascii_path = tmp_path / "ascii.log"
+    ascii_path.write_text(("\n".join(line for line in LINES if line.isascii()) + "\n") * 50, encoding="utf-8")
+    mixed_path = tmp_path / "mixed.log"
+    mixed_path.write_text(("\n".join(LINES) + "\n") * 50, encoding="utf-8")
+
+    for path in (ascii_path, mixed_path):
+        results = compare_matchers(str(path), KEYWORDS, MATCHER_MODES)
+        stats = [results[mode][1] for mode in MATCHER_MODES]
+        assert stats[0], path
+        for other in stats[1:]:
+            assert other == stats[0], path
+
+
+def test_corrupt_or_missing_input_with_auto_parser(tmp_path, capsys):
+    good = tmp_path / "a.log"
+    good.write_text("2024-01-01 00:00:00 error: disk full\n" * 10, encoding="utf-8")
+    bad = tmp_path / "bad.log.gz"
+    bad.write_bytes(gzip.compress(good.read_bytes())[:20])  # 截断到识别格式时就会出错
+
+    assert main([str(good), str(bad), "-p", "auto", "-f", "csv", "-j", "2"]) == 0
+    rows = list(csv.reader(io.StringIO(capsys.readouterr().out)))
+    assert [str(good), "<总行数>", "10"] in rows
+    assert any(row[0] == str(bad) and row[1] == "<读取失败>" for row in rows)
+
+    # 展开通配符之后才消失的文件
+    missing = str(tmp_path / "missing.log")
+    for series in (False, True):
+        result = analyze_job((missing, KEYWORDS, "trie", "auto", False, series, False))
+        assert result["error"].startswith("FileNotFoundError"), result
+
+
+def test_read_lines_from_compressed_sources(tmp_path, monkeypatch):
+    # 检查点间隔调小，让小文件也有多个检查点
+    monkeypatch.setattr(log_analyzer_core, "GZIP_CHECKPOINT", 4096)
+    monkeypatch.setattr(log_analyzer_core, "GZIP_READ", 512)
+    text = "".join(f"2024-01-01 00:00:00 {'error' if i % 7 == 0 else 'info'} line {i}\n" for i in range(5000))
+    plain = tmp_path / "plain.log"
+    plain.write_text(text * 2, encoding="utf-8")
+    half = len(text.encode()) // 2
+    sources = {
+        "two_members.log.gz": gzip.compress(text.encode()[:half]) + gzip.compress(text.encode()[half:] + text.encode()),
+        "plain.log.bz2": bz2.compress((text * 2).encode()),
+        "plain.log.xz": lzma.compress((text * 2).encode()),
+    }
+    expected = LogStreamAnalyzer(["error"]).analyze_file(str(plain))
+    offsets = list(expected.postings["Error 错误"].offsets)
+    picks = offsets[::-37] + offsets[:5] + offsets[-5:]  # 乱序，包括向前和向后跳
+    want = [line.rstrip("\n") for line in expected.read_lines(picks)]
+    for name, data in sources.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        analyzer = LogStreamAnalyzer(["error"]).analyze_file(str(path))
+        assert list(analyzer.postings["Error 错误"].offsets) == offsets, name
+        assert [line.rstrip("\n") for line in analyzer.read_lines(picks)] == want, name
+    assert len(analyzer.gzip_indexes) == 0 and len(analyzer.hit_lines) == 1